@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks import corpus
+from engine import db as store
+from engine.profiling import current_rss_mb
+
+# analyze_edit reads editor profiles; without a server use the in-memory store
+if not os.getenv("MONGODB_URI"):
+    store.use_backend("memory")
+
+RESULTS_DIR = ROOT_DIR / "benchmarks" / "results"
+
+# ---------------- MEASUREMENT ---------------- #
+
+def measure(func, inputs, repeat):
+    # Warm-up call (model loading, regex compilation) is excluded
+    func(*inputs[0])
+
+    latencies = []
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        for args in inputs:
+            t0 = time.perf_counter()
+            func(*args)
+            latencies.append(time.perf_counter() - t0)
+
+    total = time.perf_counter() - start
+
+    # Separate pass for memory so tracing overhead does not skew timings
+    rss_before = current_rss_mb()
+    tracemalloc.start()
+    for args in inputs:
+        func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = current_rss_mb()
+
+    lat_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(lat_ms, [50, 95, 99])
+
+    return {
+        "calls": len(latencies),
+        "edits_per_sec": round(len(latencies) / total, 2) if total > 0 else None,
+        "mean_ms": round(float(lat_ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "peak_alloc_mb": round(peak / 1024 ** 2, 3),
+        "rss_delta_mb": round(rss_after - rss_before, 1)
+    }
+
+# ---------------- CASES ---------------- #
+
+def build_cases(with_models):
+    from services.scraper.wiki_scrapper import clean_wiki_text_nlp
+    from engine.core_engine import (
+        compute_content_risk, compute_username_risk,
+        compute_semantic_similarity, analyze_edit
+    )
+
+    raw = corpus.articles()
+    pairs = corpus.edit_pairs(clean_wiki_text_nlp)
+    usernames = [(u,) for u in corpus.USERNAMES]
+
+    cases = []
+
+    for name, text in raw.items():
+        cases.append(("clean_wiki_text_nlp", name, clean_wiki_text_nlp, [(text,)], False))
+
+    for key, (old, new) in pairs.items():
+        article, kind = key.split("/")
+
+        if kind == "major":
+            cases.append(("compute_content_risk", article, compute_content_risk, [(new,)], False))
+            cases.append((
+                "compute_semantic_similarity", article,
+                compute_semantic_similarity, [(old, new)], True
+            ))
+
+        cases.append((
+            "analyze_edit", key, analyze_edit,
+            [(old, new, u) for (u,) in usernames[:3]],
+            kind == "major"
+        ))
+
+    cases.append(("compute_username_risk", "usernames", compute_username_risk, usernames, False))
+
+    if with_models:
+        from engine.topic_modeling import fit_topics
+
+        docs = corpus.topic_documents(clean_wiki_text_nlp)
+        cases.append(("generate_topics", f"{len(docs)}_docs", fit_topics, [(docs,)], True))
+
+    return [c for c in cases if with_models or not c[4]]
+
+# ---------------- RESULTS ---------------- #
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True
+        ).strip()
+        dirty = bool(subprocess.check_output(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR, text=True
+        ).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+def compare(current, baseline_path):
+    baseline = json.loads(Path(baseline_path).read_text())
+
+    base = {(r["case"], r["input"]): r for r in baseline["results"]}
+
+    print(f"\n=== Compared with {baseline['meta']['commit']} ===\n")
+    print(f"{'case':<30} {'input':<32} {'p50 ratio':>10} {'edits/s ratio':>14}")
+
+    for r in current["results"]:
+        b = base.get((r["case"], r["input"]))
+        if not b or not b["p50_ms"] or not b["edits_per_sec"]:
+            continue
+        print(
+            f"{r['case']:<30} {r['input']:<32} "
+            f"{r['p50_ms'] / b['p50_ms']:>10.2f} {r['edits_per_sec'] / b['edits_per_sec']:>14.2f}"
+        )
+
+# ---------------- MAIN ---------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="InfoGuard engine micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", action="append", help="benchmark only these cases")
+    parser.add_argument("--skip-models", action="store_true",
+                        help="skip cases that need the sentence-transformer / BERTopic models")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--record", metavar="TITLE", action="append",
+                        help="fetch a live article into benchmarks/data/ and exit")
+    args = parser.parse_args()
+
+    if args.record:
+        for title in args.record:
+            print("Recorded", corpus.record_article(title))
+        return
+
+    commit, dirty = git_commit()
+
+    results = []
+
+    for case, input_name, func, inputs, _ in build_cases(not args.skip_models):
+
+        if args.only and case not in args.only:
+            continue
+
+        # fitting topics is far heavier than the per-edit paths
+        repeat = 1 if case == "generate_topics" else args.repeat
+
+        stats = measure(func, inputs, repeat)
+        results.append({"case": case, "input": input_name, **stats})
+
+        print(
+            f"{case:<30} {input_name:<32} {stats['edits_per_sec']:>10} edits/s "
+            f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms "
+            f"peak={stats['peak_alloc_mb']}MB"
+        )
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": corpus.SEED,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit}{'-dirty' if dirty else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    print("\nSaved", output)
+
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import os
+import random
+from pathlib import Path
+
+# ---------------- FIXED CORPUS ---------------- #
+
+# Everything here is deterministic for a given SEED, so results from
+# different commits are measured on identical inputs.
+
+SEED = 1337
+
+CORPUS_DIR = Path(__file__).resolve().parent / "data"
+
+# Approximate article sizes (characters of raw wikitext)
+ARTICLE_SIZES = {
+    "small": 2_000,
+    "medium": 20_000,
+    "large": 100_000,
+    "xlarge": 400_000
+}
+
+VOCABULARY = [
+    "government", "election", "history", "population", "economy", "river",
+    "university", "museum", "railway", "district", "season", "championship",
+    "album", "released", "village", "century", "empire", "province",
+    "festival", "research", "company", "founded", "minister", "parliament",
+    "temple", "fortress", "battle", "treaty", "industry", "culture"
+]
+
+RISK_INSERTS = [
+    "This was exposed as propaganda by the corrupt media.",
+    "The official account is a hoax and a fraud.",
+    "Many believe the agenda was manipulated to hide the truth."
+]
+
+USERNAMES = [
+    "Historian1987", "RiverWatcher", "OFFICIALNEWSDESK", "TruthExposed2024",
+    "Cat lover", "Anti-Agenda-Media", "Jane.Doe", "User4455123", "BrandStoreOfficial",
+    "Wikignome"
+]
+
+def sentence(rng):
+    words = rng.choices(VOCABULARY, k=rng.randint(8, 18))
+    return " ".join(words).capitalize() + "."
+
+def paragraph(rng):
+    parts = []
+    for _ in range(rng.randint(3, 6)):
+        text = sentence(rng)
+        roll = rng.random()
+        if roll < 0.25:
+            text += f"<ref>{{{{cite web |url=https://example.org/{rng.randint(1, 99999)} |title={sentence(rng)}}}}}</ref>"
+        elif roll < 0.45:
+            word = rng.choice(VOCABULARY)
+            text = text.replace(word, f"[[{word.capitalize()}|{word}]]", 1)
+        elif roll < 0.55:
+            text += f" [{rng.randint(1, 300)}]"
+        parts.append(text)
+    return " ".join(parts)
+
+def synthetic_article(size, seed=SEED):
+    rng = random.Random(f"{seed}-{size}")
+
+    chunks = [
+        "{{Infobox settlement\n| name = Example\n| population = "
+        f"{rng.randint(1000, 900000)}\n| established = {rng.randint(1100, 1990)}\n}}}}\n",
+        f"'''Example''' is a {rng.choice(VOCABULARY)} in the {rng.choice(VOCABULARY)}.\n\n"
+    ]
+    length = sum(len(c) for c in chunks)
+
+    section = 0
+    while length < size:
+        if rng.random() < 0.2:
+            section += 1
+            chunk = f"\n== {rng.choice(VOCABULARY).capitalize()} {section} ==\n"
+        else:
+            chunk = paragraph(rng) + "\n\n"
+        chunks.append(chunk)
+        length += len(chunk)
+
+    chunks.append("\n== References ==\n{{Reflist}}\n[[Category:Examples]]\n")
+
+    return "".join(chunks)[:size]
+
+def recorded_articles():
+    # Wikitext samples checked into benchmarks/data/: pages fetched with
+    # record_article, plus hand-written ones named synthetic_*
+    if not CORPUS_DIR.exists():
+        return {}
+
+    return {
+        path.stem: path.read_text(encoding="utf-8")
+        for path in sorted(CORPUS_DIR.glob("*.wikitext"))
+    }
+
+def record_article(title):
+    # Fetch the current wikitext of a live page into the corpus directory
+    from services.scraper.wiki_scrapper import fetch_latest_revision, extract_revision_info
+
+    data = fetch_latest_revision(title)
+    rev = extract_revision_info(data) if data else None
+
+    if not rev:
+        raise RuntimeError(f"Could not fetch {title}")
+
+    CORPUS_DIR.mkdir(exist_ok=True)
+    path = CORPUS_DIR / (title.replace(" ", "_").replace(os.sep, "_") + ".wikitext")
+    path.write_text(rev["content"], encoding="utf-8")
+
+    return path
+
+def articles():
+    corpus = {f"synthetic_{name}": synthetic_article(size) for name, size in ARTICLE_SIZES.items()}
+    corpus.update({
+        name if name.startswith("synthetic_") else f"recorded_{name}": text
+        for name, text in recorded_articles().items()
+    })
+    return corpus
+
+# ---------------- EDIT PAIRS ---------------- #
+
+def make_edit(text, kind, seed=SEED):
+    # Returns a modified copy of `text`: "minor" stays under the
+    # is_minor_edit threshold, "major" rewrites a block and adds risk words.
+    rng = random.Random(f"{seed}-{kind}-{len(text)}")
+
+    if kind == "minor":
+        pos = rng.randint(0, max(len(text) - 1, 0))
+        return text[:pos] + " small copyedit" + text[pos:]
+
+    cut = rng.randint(0, max(len(text) // 2, 0))
+    removed = len(text) // 10
+    insert = " ".join(rng.choice(RISK_INSERTS) for _ in range(6))
+    return text[:cut] + insert + " " + text[cut + removed:]
+
+def edit_pairs(clean):
+    # clean: callable turning wikitext into plain text (the pipeline cleaner)
+    pairs = {}
+    for name, text in articles().items():
+        old = clean(text)
+        for kind in ("minor", "major"):
+            pairs[f"{name}/{kind}"] = (old, make_edit(old, kind))
+    return pairs
+
+def topic_documents(clean, n=200, seed=SEED):
+    rng = random.Random(f"{seed}-topics")
+    docs = []
+    for i in range(n):
+        text = synthetic_article(rng.choice([1_500, 3_000, 6_000]), seed=f"{seed}-{i}")
+        if rng.random() < 0.5:
+            text += " " + rng.choice(RISK_INSERTS)
+        docs.append(clean(text))
+    return docs
@@ -0,0 +1,209 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks import corpus
+
+# ---------------- SIMULATED WIKI ---------------- #
+
+@lru_cache(maxsize=2048)
+def base_article(seed, i):
+    size = [2_000, 8_000, 20_000, 60_000][i % 4]
+    return corpus.synthetic_article(size, seed=f"{seed}-page-{i}")
+
+class FakeWiki:
+    # A deterministic wiki of `n_pages` articles. Edits arrive at
+    # `edit_rate` per second across the wiki; the revision of a page at time
+    # t is derived from the clock, so no edit log has to be kept.
+
+    def __init__(self, n_pages=10_000, edit_rate=5.0, seed=corpus.SEED):
+        self.n_pages = n_pages
+        self.edit_rate = edit_rate
+        self.seed = seed
+        self.started = time.time()
+        self.titles = [f"Harness Page {i:06d}" for i in range(n_pages)]
+        self.index = {t: i for i, t in enumerate(self.titles)}
+
+        rng = random.Random(seed)
+        # Zipf-like popularity so a few pages take most edits
+        weights = [1 / (i + 1) ** 0.8 for i in range(n_pages)]
+        total = sum(weights)
+        self.rates = [edit_rate * w / total for w in weights]
+        rng.shuffle(self.rates)
+
+    def revision_number(self, i, now=None):
+        elapsed = (now or time.time()) - self.started
+        return int(elapsed * self.rates[i] + (i % 7) / 7)
+
+    def revid(self, i, now=None):
+        return (i + 1) * 1_000_000 + self.revision_number(i, now)
+
+    def content(self, i, n):
+        text = base_article(self.seed, i)
+        # every third revision is a larger rewrite, the rest are copyedits
+        kind = "major" if n % 3 == 2 else "minor"
+        for r in range(n % 5):
+            text = corpus.make_edit(text, kind, seed=f"{self.seed}-{i}-{n}-{r}")
+        return text
+
+    def user(self, i, n):
+        return corpus.USERNAMES[(i + n) % len(corpus.USERNAMES)]
+
+    def recent_changes(self, limit):
+        now = time.time()
+        rng = random.Random(int(now))
+        picks = rng.choices(range(self.n_pages), weights=self.rates, k=limit)
+
+        return [
+            {
+                "type": "edit",
+                "ns": 0,
+                "title": self.titles[i],
+                "user": self.user(i, self.revision_number(i, now)),
+                "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "comment": "harness edit"
+            }
+            for i in picks
+        ]
+
+    def revision(self, title):
+        i = self.index.get(title)
+
+        if i is None:
+            return {"pageid": 0, "ns": 0, "title": title, "missing": True}
+
+        n = self.revision_number(i)
+        stamp = datetime.utcnow() - timedelta(seconds=random.random() * 60)
+
+        return {
+            "pageid": i + 1,
+            "ns": 0,
+            "title": title,
+            "revisions": [{
+                "revid": self.revid(i),
+                "parentid": self.revid(i) - 1,
+                "user": self.user(i, n),
+                "timestamp": stamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "comment": "harness edit",
+                "slots": {"main": {"contentmodel": "wikitext", "content": self.content(i, n)}}
+            }]
+        }
+
+# ---------------- HTTP ---------------- #
+
+def make_handler(wiki, latency_ms, jitter_ms, error_rate, timeout_rate, stats):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+            with stats["lock"]:
+                stats["requests"] += 1
+
+            delay = max(latency_ms + random.uniform(-jitter_ms, jitter_ms), 0) / 1000
+            time.sleep(delay)
+
+            roll = random.random()
+
+            if roll < timeout_rate:
+                # hang past the client's read timeout
+                time.sleep(30)
+                return
+
+            if roll < timeout_rate + error_rate:
+                with stats["lock"]:
+                    stats["errors"] += 1
+                self.send_json(random.choice([429, 500, 503]), {"error": {"code": "injected"}})
+                return
+
+            if params.get("list") == "recentchanges":
+                limit = min(int(params.get("rclimit", 500)), 5000)
+                self.send_json(200, {
+                    "batchcomplete": "",
+                    "query": {"recentchanges": wiki.recent_changes(limit)}
+                })
+                return
+
+            if params.get("prop") == "revisions":
+                titles = params.get("titles", "").split("|")
+                self.send_json(200, {
+                    "batchcomplete": True,
+                    "query": {"pages": [wiki.revision(t) for t in titles if t]}
+                })
+                return
+
+            self.send_json(400, {"error": {"code": "badrequest", "info": "unsupported query"}})
+
+    return Handler
+
+def serve(port=8765, pages=10_000, edit_rate=5.0, latency_ms=50, jitter_ms=20,
+          error_rate=0.0, timeout_rate=0.0, host="127.0.0.1"):
+    wiki = FakeWiki(pages, edit_rate)
+    stats = {"requests": 0, "errors": 0, "lock": threading.Lock()}
+
+    server = ThreadingHTTPServer(
+        (host, port),
+        make_handler(wiki, latency_ms, jitter_ms, error_rate, timeout_rate, stats)
+    )
+    server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    server.wiki = wiki
+    server.stats = stats
+    server.api_url = f"http://{host}:{server.server_address[1]}/w/api.php"
+
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MediaWiki API stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=10_000)
+    parser.add_argument("--edit-rate", type=float, default=5.0, help="edits per second across the wiki")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429/5xx")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of requests that hang")
+    args = parser.parse_args()
+
+    server = serve(
+        args.port, args.pages, args.edit_rate, args.latency_ms,
+        args.jitter_ms, args.error_rate, args.timeout_rate
+    )
+
+    print("Serving", server.api_url)
+
+    try:
+        while True:
+            time.sleep(60)
+            print("requests:", server.stats["requests"], "errors:", server.stats["errors"])
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
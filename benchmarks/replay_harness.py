@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks import fake_mediawiki
+from engine import db as store
+
+# ---------------- HARNESS ---------------- #
+
+# Runs one full monitoring cycle (discovery, page checks, topics, ML
+# scoring) against the local MediaWiki stand-in and a local MongoDB, then
+# reports throughput from the run record it wrote.
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end monitoring cycle against a fake wiki")
+    parser.add_argument("--pages", type=int, default=10_000, help="watchlist size")
+    parser.add_argument("--edit-rate", type=float, default=20.0, help="edits per second across the fake wiki")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--mongo-uri", default=os.getenv("HARNESS_MONGODB_URI", "mongodb://localhost:27017"),
+                        help="local MongoDB to write to (its infoguard database is reset)")
+    parser.add_argument("--mongomock", action="store_true",
+                        help="use an in-process mongomock store instead of a MongoDB server")
+    parser.add_argument("--prime", action="store_true",
+                        help="run an unmeasured pass first so revisions hold previous text")
+    parser.add_argument("--warmup-seconds", type=float, default=30,
+                        help="let the fake wiki accumulate edits before the cycle starts")
+    parser.add_argument("--wiki-workers", type=int, default=4, help="fetch threads for the wiki")
+    parser.add_argument("--wiki-rps", type=float, default=1000,
+                        help="API requests per second allowed against the fake wiki")
+    parser.add_argument("--output", help="write the report as JSON")
+    return parser.parse_args()
+
+def seed_watchlist(db, wiki):
+    # Pages start at their current revision, as if already being watched
+    db["pages"].insert_many([
+        {
+            "_id": title,
+            "last_revid": wiki.revid(i),
+            "last_checked": None,
+            "watch_status": "active",
+            "priority_score": 0
+        }
+        for i, title in enumerate(wiki.titles)
+    ])
+
+def main():
+    args = parse_args()
+
+    server = fake_mediawiki.serve(
+        args.port, args.pages, args.edit_rate, args.latency_ms,
+        args.jitter_ms, args.error_rate, args.timeout_rate
+    )
+
+    os.environ["WIKI_API_URL"] = server.api_url
+    os.environ["MONGODB_URI"] = args.mongo_uri
+    os.environ["INFOGUARD_MAX_PAGES"] = str(args.pages)
+    os.environ["INFOGUARD_HTTP_MODE"] = "live"
+    os.environ["INFOGUARD_WIKI_WORKERS"] = str(args.wiki_workers)
+    os.environ["INFOGUARD_WIKI_RPS"] = str(args.wiki_rps)
+
+    store.use_backend("memory" if args.mongomock else "mongo")
+
+    from services.scraper import wiki_scrapper
+
+    db = store.get_db()
+    db.client.drop_database(db.name)
+
+    seed_watchlist(db, server.wiki)
+
+    if args.prime:
+        print(f"Priming {args.pages} pages against {server.api_url}")
+        for title in server.wiki.titles:
+            wiki_scrapper.monitor_page(title)
+
+    print(f"Waiting {args.warmup_seconds}s for edits to accumulate")
+    time.sleep(args.warmup_seconds)
+
+    requests_before = server.stats["requests"]
+    errors_before = server.stats["errors"]
+
+    started = time.time()
+    wiki_scrapper.main()
+    elapsed = time.time() - started
+
+    run = store.latest_run()
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "pages": args.pages,
+        "edit_rate": args.edit_rate,
+        "latency_ms": args.latency_ms,
+        "wiki_workers": args.wiki_workers,
+        "error_rate": args.error_rate,
+        "timeout_rate": args.timeout_rate,
+        "backend": "mongomock" if args.mongomock else args.mongo_uri,
+        "elapsed_seconds": round(elapsed, 2),
+        "pages_checked": run["pages_checked"],
+        "changes_detected": run["changes_detected"],
+        "flagged": run["flagged"],
+        "pages_per_minute": round(run["pages_checked"] / (elapsed / 60), 2),
+        "api_requests": server.stats["requests"] - requests_before,
+        "api_errors": server.stats["errors"] - errors_before,
+        "embedding_batches": run.get("embedding_batches"),
+        "stages": run.get("stages", {})
+    }
+
+    server.shutdown()
+
+    print("\n=== Harness Report ===\n")
+    for key in ["pages_checked", "changes_detected", "flagged", "elapsed_seconds",
+                "pages_per_minute", "api_requests", "api_errors", "embedding_batches"]:
+        print(f"{key:<20} {report[key]}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, default=str))
+        print("\nSaved", args.output)
+
+if __name__ == "__main__":
+    main()
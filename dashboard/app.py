@@ -6,24 +6,61 @@ sys.path.insert(0, str(ROOT_DIR))
 import streamlit as st
 import pandas as pd
 import os
-from pymongo import MongoClient
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import PyMongoError
 import plotly.express as px
 
 from engine.prioritization import compute_priority
+from engine.rollups import load_series, resample_series
+from engine.db import collection, load_topics
 
 # ---------------- CONFIG ---------------- #
 
 st.set_page_config(page_title="InfoGuard AI Dashboard", layout="wide")
 px.defaults.template = "plotly_white"
 
-MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
-db = client["infoguard"]
+# Cached query results expire after this many seconds
+CACHE_TTL_SECONDS = 300
 
-runs = db["runs"]
-analysis = db["analysis"]
-anomalies = db["anomalies"]
-topics_collection = db["topics"]
+# Most anomaly markers drawn on the risk trend
+MAX_POINTS = 500
+
+TIME_WINDOWS = {
+    "Last 24 hours": 24,
+    "Last 7 days": 24 * 7,
+    "Last 30 days": 24 * 30,
+    "All time": None
+}
+
+RISK_BINS = 25
+
+# Live feed: new documents are pulled incrementally every N seconds
+AUTO_REFRESH_SECONDS = 30
+LIVE_MAX_ROWS = 2000
+
+# Use MongoDB change streams (replica sets / Atlas) instead of polling
+USE_CHANGE_STREAMS = os.getenv("DASHBOARD_CHANGE_STREAMS", "0") == "1"
+
+LIVE_SOURCES = {
+    "runs": ["timestamp", "recorded_at", "pages_checked", "changes_detected", "flagged",
+             "duration_seconds", "stages"],
+    "analysis": ["page", "username", "final_risk", "flagged", "created_at"]
+}
+
+# Field each live source is followed by. A run's _id is allocated when it
+# starts (and a recovered interrupted run keeps an old one), so runs are
+# followed by recorded_at, the time their document was written.
+LIVE_MARKS = {"runs": "recorded_at", "analysis": "_id"}
+
+# Both marks are stamped by the writing process, so with several workers a
+# document can land behind one already shown. The mark stays this far
+# behind now; newer documents are fetched again and de-duplicated.
+LIVE_LAG_SECONDS = int(os.getenv("DASHBOARD_LIVE_LAG_SECONDS", "120"))
+
+# The pooled client is created once per process by engine.db
+analysis = collection("analysis")
+anomalies = collection("anomalies")
 
 # ---------------- SAFE LOADERS ---------------- #
 
@@ -34,34 +71,222 @@ def safe_df(docs):
         d.pop("_id", None)
     return pd.DataFrame(docs)
 
-def load_runs():
-    df = safe_df(list(runs.find().sort("timestamp", 1)))
-    if not df.empty:
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-    return df
+def window_start(hours):
+    if hours is None:
+        return None
+    return datetime.utcnow() - timedelta(hours=hours)
+
+def time_match(field, hours):
+    start = window_start(hours)
+    return {field: {"$gte": start}} if start else {}
+
+def rollup_granularity(hours):
+    # Hourly buckets for short windows, daily ones beyond a week
+    return "hour" if hours is not None and hours <= 24 * 7 else "day"
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_runs(hours):
+    granularity = rollup_granularity(hours)
+    since = window_start(hours)
+
+    pages = load_series("pages_checked", granularity, since=since)
+    flagged = load_series("flagged", granularity, since=since)
+
+    if pages.empty:
+        return pd.DataFrame()
 
-def load_analysis():
-    df = safe_df(list(analysis.find()))
-    if not df.empty and "created_at" in df.columns:
-        df["created_at"] = pd.to_datetime(df["created_at"])
+    return (
+        pages[["bucket", "sum"]].rename(columns={"sum": "pages_checked"})
+        .merge(
+            flagged[["bucket", "sum"]].rename(columns={"sum": "flagged"}),
+            on="bucket", how="left"
+        )
+        .rename(columns={"bucket": "timestamp"})
+        .fillna({"flagged": 0})
+    )
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_risk_histogram(hours):
+    edges = [round(i / RISK_BINS, 4) for i in range(RISK_BINS + 1)]
+
+    docs = list(analysis.aggregate([
+        {"$match": {**time_match("created_at", hours), "final_risk": {"$exists": True}}},
+        {"$bucket": {
+            "groupBy": "$final_risk",
+            "boundaries": edges[:-1] + [1.000001],
+            "default": "other",
+            "output": {"count": {"$sum": 1}}
+        }},
+        {"$match": {"_id": {"$ne": "other"}}}
+    ], allowDiskUse=True))
+
+    df = safe_df([{"final_risk": d["_id"], "count": d["count"]} for d in docs])
     return df
 
-def load_anomalies():
-    df = safe_df(list(anomalies.find()))
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_risk_trend(hours):
+    granularity = rollup_granularity(hours)
+
+    df = load_series("final_risk", granularity, since=window_start(hours))
+
+    if granularity == "hour":
+        df = resample_series(df, "6h")
+
+    return df.rename(columns={"bucket": "created_at", "mean": "final_risk"})
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_anomalies(hours):
+    df = safe_df(list(anomalies.find(
+        {**time_match("timestamp", hours), "final_risk": {"$exists": True}},
+        {"_id": 0, "timestamp": 1, "final_risk": 1}
+    ).sort("timestamp", -1).limit(MAX_POINTS)))
     if not df.empty and "timestamp" in df.columns:
         df["timestamp"] = pd.to_datetime(df["timestamp"])
     return df
 
-def load_topics():
-    return safe_df(list(topics_collection.find()))
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_priority(hours):
+    return compute_priority(top_n=10, since=window_start(hours))
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_topic_counts():
+    return safe_df([{"Name": t["Name"], "Count": t["Count"]} for t in load_topics()])
+
+# ---------------- LIVE FEED ---------------- #
+
+# Each session keeps its own frames plus a high-water mark (LIVE_MARKS) per
+# collection; refreshes only ask for documents past that mark.
+
+def live_key(name, suffix):
+    return f"live_{name}_{suffix}"
+
+def poll_new(name, last_id):
+    field = LIVE_MARKS[name]
+    query = {field: {"$gt": last_id}} if last_id else {}
+    return list(
+        collection(name).find(query, {f: 1 for f in LIVE_SOURCES[name]})
+        .sort(field, -1 if last_id is None else 1)
+        .limit(LIVE_MAX_ROWS)
+    )
+
+def open_stream(name, resume_token=None):
+    return collection(name).watch(
+        [
+            {"$match": {"operationType": "insert"}},
+            {"$project": {f"fullDocument.{f}": 1 for f in ["_id"] + LIVE_SOURCES[name]}}
+        ],
+        max_await_time_ms=100,
+        resume_after=resume_token
+    )
+
+def stream_new(name, last_id):
+    # Drains whatever the change stream has buffered, without blocking.
+    # A stream is opened before polling from the mark, so nothing inserted
+    # in between is missed, and a lost stream is reopened from its resume
+    # token. Returns None when this refresh has to poll instead.
+    stream_key = live_key(name, "stream")
+    token_key = live_key(name, "resume_token")
+
+    stream = st.session_state.get(stream_key)
+    docs = []
+
+    if stream is None:
+        token = st.session_state.get(token_key)
+
+        try:
+            stream = open_stream(name, token)
+        except PyMongoError:
+            st.session_state[token_key] = None
+            if token is None:
+                # standalone server: no change streams
+                st.session_state[live_key(name, "polling")] = True
+            # else the token has left the oplog; the next refresh starts afresh
+            return None
+
+        st.session_state[stream_key] = stream
+        docs = poll_new(name, last_id)
+
+    try:
+        while True:
+            change = stream.try_next()
+            if change is None:
+                break
+            docs.append(change["fullDocument"])
+
+        st.session_state[token_key] = stream.resume_token
+
+    except PyMongoError:
+        # reopened from the last token on the next refresh
+        st.session_state[stream_key] = None
+
+    return docs
+
+def lagged_mark(field, newest, full_page):
+    if full_page:
+        # still catching up; lagging would fetch the same page again
+        return newest
+
+    bound = datetime.utcnow() - timedelta(seconds=LIVE_LAG_SECONDS)
+
+    if field == "_id":
+        bound = ObjectId.from_datetime(bound)
+
+    return min(newest, bound)
+
+def refresh_live(name):
+    frame_key = live_key(name, "frame")
+    mark_key = live_key(name, "mark")
+
+    last_id = st.session_state.get(mark_key)
+
+    docs = None
+    if USE_CHANGE_STREAMS and not st.session_state.get(live_key(name, "polling")):
+        docs = stream_new(name, last_id)
+
+    if docs is None:
+        docs = poll_new(name, last_id)
+
+    frame = st.session_state.get(frame_key, pd.DataFrame())
+
+    if docs:
+        field = LIVE_MARKS[name]
+        new = pd.DataFrame(docs)
+        frame = (
+            pd.concat([frame, new], ignore_index=True)
+            .drop_duplicates("_id", keep="last")
+            # runs written before recorded_at existed sort first
+            .sort_values(field, na_position="first")
+            .tail(LIVE_MAX_ROWS)
+            .reset_index(drop=True)
+        )
+        if frame[field].notna().any():
+            st.session_state[mark_key] = lagged_mark(
+                field, frame[field].dropna().iloc[-1], len(docs) >= LIVE_MAX_ROWS
+            )
+
+    st.session_state[frame_key] = frame
+    st.session_state[live_key(name, "new")] = len(docs)
+
+    return frame
+
+# ---------------- CONTROLS ---------------- #
+
+st.sidebar.markdown("### Data")
+
+window_label = st.sidebar.selectbox("Time window", list(TIME_WINDOWS), index=1)
+window_hours = TIME_WINDOWS[window_label]
+
+if st.sidebar.button("Refresh data"):
+    st.cache_data.clear()
 
 # ---------------- LOAD ---------------- #
 
-df_runs = load_runs()
-df_analysis = load_analysis()
-df_anom = load_anomalies()
-df_priority = compute_priority()
-df_topics = load_topics()
+df_runs = load_runs(window_hours)
+df_risk_hist = load_risk_histogram(window_hours)
+df_risk_trend = load_risk_trend(window_hours)
+df_anom = load_anomalies(window_hours)
+df_priority = load_priority(window_hours)
+df_topics = load_topic_counts()
 
 # =====================================================
 # =================== HEADER ==========================
@@ -74,26 +299,87 @@ st.markdown("Production-grade AI system for detecting risky Wikipedia edits, ano
 # ================= SYSTEM HEALTH =====================
 # =====================================================
 
-st.markdown("## 📈 System Health Overview")
+@st.fragment(run_every=AUTO_REFRESH_SECONDS)
+def live_panels():
 
-if not df_runs.empty:
+    df_live_runs = refresh_live("runs")
+    df_live_edits = refresh_live("analysis")
 
-    latest = df_runs.iloc[-1]
+    st.markdown("## 📈 System Health Overview")
 
-    throughput = 0
-    if latest["duration_seconds"] > 0:
-        throughput = round(latest["pages_checked"] / (latest["duration_seconds"]/60), 2)
+    if not df_live_runs.empty:
 
-    col1, col2, col3, col4, col5 = st.columns(5)
+        latest = df_live_runs.iloc[-1]
 
-    col1.metric("Pages Scanned", int(latest["pages_checked"]))
-    col2.metric("Edits Detected", int(latest["changes_detected"]))
-    col3.metric("Flagged Edits", int(latest["flagged"]))
-    col4.metric("Runtime (sec)", round(latest["duration_seconds"], 2))
-    col5.metric("Throughput (pages/min)", throughput)
+        throughput = 0
+        if latest["duration_seconds"] > 0:
+            throughput = round(latest["pages_checked"] / (latest["duration_seconds"]/60), 2)
 
-else:
-    st.info("No monitoring data yet.")
+        col1, col2, col3, col4, col5 = st.columns(5)
+
+        col1.metric("Pages Scanned", int(latest["pages_checked"]))
+        col2.metric("Edits Detected", int(latest["changes_detected"]))
+        col3.metric("Flagged Edits", int(latest["flagged"]))
+        col4.metric("Runtime (sec)", round(latest["duration_seconds"], 2))
+        col5.metric("Throughput (pages/min)", throughput)
+
+        stages = latest.get("stages")
+
+        if isinstance(stages, dict) and stages:
+
+            df_stages = (
+                pd.DataFrame.from_dict(stages, orient="index")
+                .rename_axis("stage")
+                .reset_index()
+                .sort_values("total_seconds")
+            )
+
+            st.markdown("#### ⏱ Stage Breakdown (latest run)")
+
+            colS1, colS2 = st.columns(2)
+
+            with colS1:
+                fig_stages = px.bar(
+                    df_stages,
+                    x="total_seconds",
+                    y="stage",
+                    orientation="h",
+                    labels={"total_seconds": "Total Time (sec)", "stage": "Stage"}
+                )
+                st.plotly_chart(fig_stages, use_container_width=True)
+
+            with colS2:
+                st.dataframe(
+                    df_stages.sort_values("total_seconds", ascending=False)[
+                        ["stage", "count", "total_seconds", "p50_ms", "p95_ms", "p99_ms"]
+                    ],
+                    use_container_width=True,
+                    hide_index=True
+                )
+
+    else:
+        st.info("No monitoring data yet.")
+
+    source = "polling"
+    if USE_CHANGE_STREAMS and not st.session_state.get(live_key("analysis", "polling")):
+        source = "change stream"
+
+    new_edits = st.session_state[live_key("analysis", "new")]
+
+    st.markdown("## ⚡ Live Feed")
+    st.caption(f"Latest analysed edits — {new_edits} new since the last refresh ({source}).")
+
+    if not df_live_edits.empty:
+        st.dataframe(
+            df_live_edits
+            .drop(columns=["_id"])
+            .iloc[::-1]
+            .head(50),
+            use_container_width=True,
+            hide_index=True
+        )
+
+live_panels()
 
 # =====================================================
 # ============== MONITORING ACTIVITY ==================
@@ -113,7 +399,7 @@ if not df_runs.empty:
             y="pages_checked",
             markers=True,
             labels={"timestamp": "Time", "pages_checked": "Pages Scanned"},
-            title="Pages Scanned Per Cycle"
+            title="Pages Scanned Over Time"
         )
         st.plotly_chart(fig_pages, use_container_width=True)
 
@@ -123,7 +409,7 @@ if not df_runs.empty:
             x="timestamp",
             y="flagged",
             labels={"timestamp": "Time", "flagged": "Flagged Edits"},
-            title="Flagged Edits Per Cycle"
+            title="Flagged Edits Over Time"
         )
         st.plotly_chart(fig_flagged, use_container_width=True)
 
@@ -131,7 +417,7 @@ if not df_runs.empty:
 # ================= RISK INTELLIGENCE =================
 # =====================================================
 
-if not df_analysis.empty:
+if not df_risk_hist.empty:
 
     st.markdown("## 🧠 Risk Intelligence")
 
@@ -139,29 +425,22 @@ if not df_analysis.empty:
 
     # Risk Distribution
     with col1:
-        fig_dist = px.histogram(
-            df_analysis,
+        fig_dist = px.bar(
+            df_risk_hist,
             x="final_risk",
-            nbins=25,
-            labels={"final_risk": "Risk Score"},
+            y="count",
+            labels={"final_risk": "Risk Score", "count": "Edits"},
             title="Risk Score Distribution"
         )
+        fig_dist.update_traces(width=1 / RISK_BINS, offset=0)
         fig_dist.update_layout(xaxis=dict(range=[0,1]))
         st.plotly_chart(fig_dist, use_container_width=True)
 
     # Rolling Risk Trend
     with col2:
-        if "created_at" in df_analysis.columns:
-            df_hourly = (
-                df_analysis
-                .set_index("created_at")
-                .resample("6H")
-                .mean(numeric_only=True)
-                .reset_index()
-            )
-
+        if not df_risk_trend.empty:
             fig_trend = px.line(
-                df_hourly,
+                df_risk_trend,
                 x="created_at",
                 y="final_risk",
                 labels={"created_at": "Time", "final_risk": "Avg Risk"},
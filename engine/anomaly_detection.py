@@ -1,13 +1,69 @@
-import pandas as pd, os
-from pymongo import MongoClient
+import pandas as pd, math, logging
+from datetime import datetime
+from pymongo import UpdateOne, ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from engine.rollups import load_series
+from engine.db import collection
 
-MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
-db = client["infoguard"]
+analysis = collection("analysis")
+runs = collection("runs")
+anomalies = collection("anomalies")
+anomaly_state = collection("anomaly_state")
+run_checkpoints = collection("run_checkpoints")
 
-analysis = db["analysis"]
-runs = db["runs"]
-anomalies = db["anomalies"]
+logger = logging.getLogger(__name__)
+
+# ---------------- STREAMING CONFIG ---------------- #
+
+# EWMA smoothing factor (~ a 20 observation memory)
+STREAM_ALPHA = 0.1
+
+# Observations needed before a series may raise spikes
+STREAM_WARMUP = 10
+
+STREAM_THRESHOLD = 2
+
+# Attempts at a contended state update before the observation is dropped
+STREAM_CAS_RETRIES = 20
+
+# Scope used for series that are not tied to a single page
+GLOBAL_SCOPE = "__global__"
+
+ANALYSIS_METRICS = ["final_risk"]
+RUN_METRICS = ["changes_detected", "flagged", "pages_checked"]
+
+# ---------------- INDEXES ---------------- #
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+
+    if _indexes_ready:
+        return
+
+    # per-page anomaly counts ($lookup in prioritization)
+    anomalies.create_index([("page", ASCENDING)])
+
+    # Every spike upsert matches on spike_key(). Unique, so concurrent
+    # workers upserting the same spike end up with one document; anomalies
+    # from before the key existed (no metric) are left out.
+    key = [("metric", ASCENDING), ("scope", ASCENDING),
+           ("granularity", ASCENDING), ("timestamp", ASCENDING)]
+
+    try:
+        anomalies.create_index(
+            key, unique=True, partialFilterExpression={"metric": {"$exists": True}}
+        )
+    except OperationFailure:
+        logger.warning("Duplicate spikes in anomalies; run the backfill to rebuild them")
+        anomalies.create_index(key)
+
+    _indexes_ready = True
+
+def spike_key(metric, scope, timestamp, granularity=None):
+    # granularity is only set on rollup spikes (one per bucket size)
+    return {"metric": metric, "scope": scope, "granularity": granularity, "timestamp": timestamp}
 
 def load_runs_df(limit=200):
     docs = list(runs.find().sort("timestamp", 1).limit(limit))
@@ -40,15 +96,36 @@ def detect_volume_anomalies(df, window = 10, threshold = 2):
 def detect_risk_anomalies(df, window = 10, threshold = 2):
     df["risk_mean"] = df["flagged"].rolling(window).mean()
     df["risk_std"] = df["flagged"].rolling(window).std()
-    
+
     df["risk_z"] = (df["flagged"] - df["risk_mean"]) / df["risk_std"]
     df["risk_anomaly"] = df["risk_z"].abs() > threshold
 
     return df
 
+def load_page_risk_df(since=None, batch_size=5000):
+    query = {"page": {"$exists": True}, "final_risk": {"$exists": True}}
+
+    if since is not None:
+        query["created_at"] = {"$gte": since}
+
+    cursor = analysis.find(
+        query,
+        {"_id": 0, "page": 1, "final_risk": 1, "created_at": 1}
+    ).batch_size(batch_size)
+
+    df = pd.DataFrame(list(cursor), columns=["page", "final_risk", "created_at"])
+    df["created_at"] = pd.to_datetime(df["created_at"])
+    return df
+
 def detect_risk_spikes(df, window = 10, threshold = 2):
-    df["rolling_risk_mean"] = df["final_risk"].rolling(window).mean()
-    df["rolling_risk_std"] = df["final_risk"].rolling(window).std()
+    # Rolling statistics are computed per page in one grouped pass, so edits
+    # of different pages never share a window.
+    df = df.sort_values(["page", "created_at"], kind="stable").reset_index(drop=True)
+
+    rolling = df.groupby("page", sort=False)["final_risk"].rolling(window)
+
+    df["rolling_risk_mean"] = rolling.mean().reset_index(level=0, drop=True)
+    df["rolling_risk_std"] = rolling.std().reset_index(level=0, drop=True)
 
     df["risk_z"] = (
         (df["final_risk"] - df["rolling_risk_mean"]) / df["rolling_risk_std"]
@@ -59,18 +136,346 @@ def detect_risk_spikes(df, window = 10, threshold = 2):
     return df
 
 def store_risk_anomalies(df):
-    spikes = df[df["risk_anomaly"] == True]
-
-    for _, row in spikes.iterrows():
-        anomalies.update_one(
-            {
-                "timestamp": row["created_at"],
-                "page": row["page"]
-            },
+    spikes = df.loc[df["risk_anomaly"], ["created_at", "page", "final_risk", "risk_z"]]
+
+    if spikes.empty:
+        return 0
+
+    ensure_indexes()
+
+    detected_at = datetime.utcnow()
+
+    # same key as the streaming detector, so an edit both detectors flag
+    # stays one anomaly
+    ops = [
+        UpdateOne(
+            spike_key("final_risk", page, created_at.to_pydatetime()),
             {"$set": {
-                "final_risk": row["final_risk"],
-                "risk_z": row["risk_z"],
-                "detected_at": pd.Timestamp.utcnow()
+                "page": page,
+                "value": float(final_risk),
+                "z": round(float(risk_z), 3),
+                "final_risk": float(final_risk),
+                "risk_z": round(float(risk_z), 3),
+                "detected_at": detected_at,
+                "source": "batch"
             }},
             upsert=True
-        )
\ No newline at end of file
+        )
+        for created_at, page, final_risk, risk_z in spikes.itertuples(index=False)
+    ]
+
+    result = anomalies.bulk_write(ops, ordered=False)
+
+    return result.upserted_count + result.modified_count
+
+def run_page_risk_detection(since=None, window=10, threshold=2):
+    df = load_page_risk_df(since)
+
+    if df.empty:
+        return 0
+
+    return store_risk_anomalies(detect_risk_spikes(df, window, threshold))
+
+# ---------------- ROLLUP DETECTOR ---------------- #
+
+def detect_rollup_spikes(metric="final_risk", granularity="hour", since=None,
+                         window=24, threshold=2):
+    # Works on pre-aggregated bucket means instead of raw edits, so the cost
+    # depends on the time span covered, not on the edit volume.
+    df = load_series(metric, granularity, since=since)
+
+    if df.empty:
+        return df
+
+    df["rolling_mean"] = df["mean"].rolling(window).mean()
+    df["rolling_std"] = df["mean"].rolling(window).std()
+
+    df["z_score"] = (df["mean"] - df["rolling_mean"]) / df["rolling_std"]
+    df["is_anomaly"] = df["z_score"].abs() > threshold
+
+    return df
+
+def store_rollup_spikes(df, metric="final_risk", granularity="hour"):
+    spikes = df.loc[df["is_anomaly"], ["bucket", "mean", "z_score"]]
+
+    if spikes.empty:
+        return 0
+
+    ensure_indexes()
+
+    detected_at = datetime.utcnow()
+
+    ops = [
+        UpdateOne(
+            spike_key(metric, GLOBAL_SCOPE, bucket.to_pydatetime(), granularity),
+            {"$set": {
+                "page": None,
+                "value": float(mean),
+                "z": round(float(z), 3),
+                "detected_at": detected_at,
+                "source": "rollup",
+                **({"final_risk": float(mean), "risk_z": round(float(z), 3)}
+                   if metric == "final_risk" else {})
+            }},
+            upsert=True
+        )
+        for bucket, mean, z in spikes.itertuples(index=False)
+    ]
+
+    result = anomalies.bulk_write(ops, ordered=False)
+
+    return result.upserted_count + result.modified_count
+
+# ---------------- STREAMING DETECTOR ---------------- #
+
+# State lives in `anomaly_state`, one document per (metric, scope) holding
+# the EWMA mean/variance, so every observation is an O(1) update.
+
+def state_key(metric, scope):
+    return f"{metric}|{scope}"
+
+def new_state(metric, scope):
+    return {
+        "_id": state_key(metric, scope),
+        "metric": metric,
+        "scope": scope,
+        "count": 0,
+        "mean": 0.0,
+        "var": 0.0,
+        "last_value": None,
+        "last_timestamp": None
+    }
+
+def update_state(state, value, alpha=STREAM_ALPHA, warmup=STREAM_WARMUP):
+    # z-score is measured against the state *before* this observation
+
+    z = None
+
+    if state["count"] >= warmup and state["var"] > 0:
+        z = (value - state["mean"]) / math.sqrt(state["var"])
+
+    if state["count"] == 0:
+        state["mean"] = float(value)
+        state["var"] = 0.0
+    else:
+        diff = value - state["mean"]
+        incr = alpha * diff
+        state["mean"] += incr
+        state["var"] = (1 - alpha) * (state["var"] + diff * incr)
+
+    state["count"] += 1
+    state["last_value"] = float(value)
+
+    return z
+
+def spike_record(metric, scope, value, z, timestamp):
+    record = {
+        "metric": metric,
+        "page": None if scope == GLOBAL_SCOPE else scope,
+        "scope": scope,
+        "value": float(value),
+        "z": round(z, 3),
+        "timestamp": timestamp,
+        "detected_at": datetime.utcnow(),
+        "source": "stream"
+    }
+
+    # keep the fields the dashboard / prioritization already read
+    if metric == "final_risk":
+        record["final_risk"] = float(value)
+        record["risk_z"] = round(z, 3)
+
+    return record
+
+def observe(metric, scope, value, timestamp, threshold=STREAM_THRESHOLD):
+
+    if value is None:
+        return None
+
+    key = state_key(metric, scope)
+
+    # Compare-and-swap on `count`, which every update increments: worker
+    # processes share the global series, and a plain read-then-replace
+    # would let them overwrite each other's EWMA state.
+    for _ in range(STREAM_CAS_RETRIES):
+
+        stored = anomaly_state.find_one({"_id": key})
+        state = dict(stored) if stored else new_state(metric, scope)
+        seen = state["count"]
+
+        z = update_state(state, float(value))
+
+        state["last_timestamp"] = timestamp
+
+        if stored is None:
+            try:
+                anomaly_state.insert_one(state)
+                break
+            except DuplicateKeyError:
+                continue
+
+        if anomaly_state.replace_one({"_id": key, "count": seen}, state).matched_count:
+            break
+
+    else:
+        logger.warning("Gave up updating %s after %s conflicting writes", key, STREAM_CAS_RETRIES)
+        return None
+
+    if z is None or abs(z) <= threshold:
+        return None
+
+    spike = spike_record(metric, scope, value, z, timestamp)
+
+    ensure_indexes()
+
+    anomalies.update_one(
+        spike_key(metric, scope, timestamp),
+        {"$set": spike},
+        upsert=True
+    )
+
+    return spike
+
+def observe_analysis(doc):
+    spikes = []
+
+    for metric in ANALYSIS_METRICS:
+        for scope in (doc["page"], GLOBAL_SCOPE):
+            spike = observe(metric, scope, doc.get(metric), doc["created_at"])
+            if spike:
+                spikes.append(spike)
+
+    return spikes
+
+def observe_run(doc):
+    spikes = []
+
+    for metric in RUN_METRICS:
+        spike = observe(metric, GLOBAL_SCOPE, doc.get(metric), doc["timestamp"])
+        if spike:
+            spikes.append(spike)
+
+    return spikes
+
+# ---------------- BACKFILL ---------------- #
+
+def replay(cursor, metrics, scopes_for, time_field, chunk_size):
+    # States are cached in memory only for the scopes seen so far and are
+    # flushed (with the detected spikes) once per chunk.
+
+    states = {}
+    dirty = set()
+    pending_spikes = []
+    processed = 0
+    spike_count = 0
+
+    def flush():
+        if dirty:
+            anomaly_state.bulk_write(
+                [
+                    UpdateOne({"_id": k}, {"$set": states[k]}, upsert=True)
+                    for k in dirty
+                ],
+                ordered=False
+            )
+            dirty.clear()
+
+        if pending_spikes:
+            anomalies.bulk_write(
+                [
+                    UpdateOne(
+                        spike_key(s["metric"], s["scope"], s["timestamp"]),
+                        {"$set": s},
+                        upsert=True
+                    )
+                    for s in pending_spikes
+                ],
+                ordered=False
+            )
+            pending_spikes.clear()
+
+    for doc in cursor:
+
+        for metric in metrics:
+
+            value = doc.get(metric)
+
+            if value is None:
+                continue
+
+            for scope in scopes_for(doc):
+
+                key = state_key(metric, scope)
+
+                if key not in states:
+                    states[key] = new_state(metric, scope)
+
+                state = states[key]
+                z = update_state(state, float(value))
+                state["last_timestamp"] = doc[time_field]
+                dirty.add(key)
+
+                if z is not None and abs(z) > STREAM_THRESHOLD:
+                    pending_spikes.append(
+                        spike_record(metric, scope, value, z, doc[time_field])
+                    )
+                    spike_count += 1
+
+        processed += 1
+
+        if processed % chunk_size == 0:
+            flush()
+
+    flush()
+
+    return {"processed": processed, "spikes": spike_count}
+
+def backfill(chunk_size=1000):
+    # Rebuilds the streaming state from scratch by replaying all history in
+    # time order; existing states and stream spikes are replaced. Documents
+    # are streamed from server-side cursors in `chunk_size` batches.
+    # Live workers' observe() calls would race the reset, so it refuses to
+    # run while any monitoring run holds a checkpoint.
+
+    if run_checkpoints.find_one({}, {"_id": 1}):
+        raise RuntimeError(
+            "A monitoring run is in progress (or died and was not recovered yet); "
+            "stop the workers before the backfill"
+        )
+
+    ensure_indexes()
+
+    anomaly_state.delete_many({})
+    anomalies.delete_many({"source": "stream"})
+
+    analysis_cursor = analysis.find(
+        {"created_at": {"$exists": True}},
+        {"page": 1, "created_at": 1, **{m: 1 for m in ANALYSIS_METRICS}}
+    ).sort("created_at", 1).batch_size(chunk_size)
+
+    analysis_stats = replay(
+        analysis_cursor,
+        ANALYSIS_METRICS,
+        lambda d: (d["page"], GLOBAL_SCOPE),
+        "created_at",
+        chunk_size
+    )
+
+    # runs cut short by the budget or a crash are not comparable
+    runs_cursor = runs.find(
+        {"timestamp": {"$exists": True}, "status": {"$in": [None, "completed"]}},
+        {"timestamp": 1, **{m: 1 for m in RUN_METRICS}}
+    ).sort("timestamp", 1).batch_size(chunk_size)
+
+    runs_stats = replay(
+        runs_cursor,
+        RUN_METRICS,
+        lambda d: (GLOBAL_SCOPE,),
+        "timestamp",
+        chunk_size
+    )
+
+    return {"analysis": analysis_stats, "runs": runs_stats}
+
+if __name__ == "__main__":
+    print(backfill())
@@ -1,36 +1,43 @@
-import pandas as pd, os
-from pymongo import MongoClient
+import os, pickle, hmac, hashlib, logging
+from datetime import datetime, timedelta
+from bson.binary import Binary
 from sklearn.ensemble import IsolationForest
+from engine.feature_store import FEATURE_COLUMNS, load_matrix, load_frame
+from engine.db import collection
 
-MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
+ml_anomalies = collection("ml_anomalies")
+ml_models = collection("ml_models")
 
-db = client["infoguard"]
+logger = logging.getLogger(__name__)
 
-analysis = db["analysis"]
-ml_anomalies = db["ml_anomalies"]
+# ---------------- CONFIG ---------------- #
 
-def load_features():
-    docs = list(analysis.find())
+MODEL_ID = "isolation_forest"
 
-    cleaned = []
-    for d in docs:
-        if "final_risk" in d and "semantic_similarity" in d:
-            cleaned.append({
-                "page": d["page"],
-                "final_risk": d["final_risk"],
-                "semantic_similarity": d["semantic_Similarity"]
-            })
-    
-    return pd.DataFrame(cleaned)
+FEATURES = FEATURE_COLUMNS
 
-def run_ml_anomaly_detection():
-    df = load_features()
+# Train on the most recent N edit feature records only
+TRAIN_WINDOW = 5000
+
+# Refit once the persisted model is older than this
+MODEL_MAX_AGE_HOURS = 24
+
+BATCH_SIZE = 1000
 
-    if df.empty or len(df) < 10:
-        return
+# The fitted model is shared with the other workers as a pickle in
+# ml_models. Unpickling runs code, so the blob is HMAC-signed with this key
+# and only loaded when the signature matches; without a key the model is
+# kept in process and refitted by each worker.
+MODEL_SIGNING_KEY = os.getenv("INFOGUARD_MODEL_SIGNING_KEY", "").encode()
 
-    X = df[["final_risk", "semantic_similarity"]]
+# In-process copy of the persisted model
+_model_cache = {"trained_at": None, "model": None}
+
+def train_model(window=TRAIN_WINDOW):
+    X = load_matrix(columns=FEATURES, limit=window, sort=[("_id", -1)])
+
+    if len(X) < 10:
+        return None
 
     model = IsolationForest(
         n_estimators=150,
@@ -38,15 +45,127 @@ def run_ml_anomaly_detection():
         random_state=42
     )
 
-    preds = model.fit_predict(X)
+    model.fit(X)
+
+    trained_at = datetime.utcnow()
+
+    update = {"$set": {
+        "features": FEATURES,
+        "n_samples": len(X),
+        "trained_at": trained_at
+    }}
+
+    if MODEL_SIGNING_KEY:
+        blob = pickle.dumps(model)
+        update["$set"].update(model=Binary(blob), signature=sign(blob))
+    else:
+        update["$unset"] = {"model": "", "signature": ""}
+
+    ml_models.update_one({"_id": MODEL_ID}, update, upsert=True)
+
+    _model_cache.update(trained_at=trained_at, model=model)
+
+    return model
+
+def sign(blob):
+    return hmac.new(MODEL_SIGNING_KEY, blob, hashlib.sha256).hexdigest()
+
+def load_model():
+    meta = ml_models.find_one({"_id": MODEL_ID}, {"model": 0})
+
+    if meta is None or meta.get("features") != FEATURES:
+        return None, None
+
+    if _model_cache["trained_at"] != meta["trained_at"]:
+        if not MODEL_SIGNING_KEY or "signature" not in meta:
+            return None, None
+
+        blob = bytes(ml_models.find_one({"_id": MODEL_ID}, {"model": 1})["model"])
+
+        if not hmac.compare_digest(sign(blob), meta.get("signature") or ""):
+            logger.warning("Stored %s model fails its signature check; refitting", MODEL_ID)
+            return None, None
+
+        _model_cache.update(trained_at=meta["trained_at"], model=pickle.loads(blob))
+
+    return _model_cache["model"], meta
+
+def get_model():
+    model, meta = load_model()
+
+    max_age = timedelta(hours=MODEL_MAX_AGE_HOURS)
+
+    if model is None or datetime.utcnow() - meta["trained_at"] > max_age:
+        model = train_model()
+
+    return model
+
+def anomaly_records(model, X, df):
+    if df.empty:
+        return []
+
+    mask = model.predict(X) == -1
+
+    if not mask.any():
+        return []
+
+    scores = model.decision_function(X[mask])
+    features = X[mask]
+    spikes = df[mask].rename(columns={"_id": "feature_id"})
+
+    detected_at = datetime.utcnow()
+
+    return [
+        {
+            "feature_id": row.feature_id,
+            "page": row.page,
+            "revid": row.revid,
+            "created_at": row.created_at,
+            "final_risk": float(row.final_risk),
+            "semantic_similarity": float(x[FEATURES.index("similarity")]),
+            "features": dict(zip(FEATURES, x.tolist())),
+            "anomaly_score": round(float(score), 4),
+            "detected_at": detected_at
+        }
+        for row, x, score in zip(spikes.itertuples(index=False), features, scores)
+    ]
+
+def run_ml_anomaly_detection():
+    # Incremental batches: score every edit feature record written since the
+    # last pass, walking the store in _id order from the stored watermark.
+
+    model = get_model()
+
+    if model is None:
+        return 0
+
+    meta = ml_models.find_one({"_id": MODEL_ID}, {"scored_until_id": 1})
+    last_id = meta.get("scored_until_id")
+
+    stored = 0
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id else {}
+
+        X, df = load_frame(query, columns=FEATURES, limit=BATCH_SIZE, sort=[("_id", 1)])
+
+        if df.empty:
+            break
+
+        records = anomaly_records(model, X, df)
+
+        if records:
+            ml_anomalies.insert_many(records)
+            stored += len(records)
+
+        last_id = df["_id"].iloc[-1]
 
-    df["is_anomaly"] = preds == -1
+        ml_models.update_one(
+            {"_id": MODEL_ID},
+            {"$set": {"scored_until_id": last_id}}
+        )
 
-    ml_anomalies.delete_many({})
+        if len(df) < BATCH_SIZE:
+            break
 
-    for _, row in df[df["is_anomaly"]].iterrows():
-        ml_anomalies.insert_one({
-            "page": row["page"],
-            "final_risk": float(row["final_risk"]),
-            "semantic_similarity": float(row["semantic_similarity"])
-        })
\ No newline at end of file
+    return stored
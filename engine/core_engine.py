@@ -1,6 +1,9 @@
 import re
 from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
+from engine.instrumentation import timed
+from engine.embedding_store import EMBEDDING_MODEL, edit_vectors
+from engine.editor_profiles import get_profile, editor_summary
 
 # ---------------- MODEL CACHE ---------------- #
 
@@ -10,7 +13,7 @@ def load_models():
     global semantic_model
     if semantic_model is None:
         print("Loading semantic model...")
-        semantic_model = SentenceTransformer("all-MiniLM-L6-v2")
+        semantic_model = SentenceTransformer(EMBEDDING_MODEL)
     return semantic_model
 
 # ---------------- RISK LEXICONS ---------------- #
@@ -46,18 +49,20 @@ def is_minor_edit(old_text, new_text):
 
 # ---------------- SEMANTIC SIMILARITY ---------------- #
 
-def compute_semantic_similarity(old_text, new_text):
-    if not old_text or not new_text:
-        return 1.0
-
+def encode_texts(texts, batch_size=64):
     model = load_models()
 
-    embeddings = model.encode(
-        [old_text, new_text],
+    return model.encode(
+        texts,
+        batch_size=batch_size,
         normalize_embeddings=True,
         show_progress_bar=False
     )
 
+def encode_edit(old_text, new_text):
+    return encode_texts([old_text, new_text])
+
+def similarity_from_embeddings(embeddings):
     similarity = cosine_similarity(
         [embeddings[0]],
         [embeddings[1]]
@@ -65,6 +70,12 @@ def compute_semantic_similarity(old_text, new_text):
 
     return round(float(similarity), 3)
 
+def compute_semantic_similarity(old_text, new_text):
+    if not old_text or not new_text:
+        return 1.0
+
+    return similarity_from_embeddings(encode_edit(old_text, new_text))
+
 # ---------------- CONTENT RISK ---------------- #
 
 def compute_content_risk(text):
@@ -126,22 +137,39 @@ def compute_username_risk(username):
 
 # ---------------- CORE ENGINE ---------------- #
 
-def analyze_edit(old_text, new_text, username):
-    username_risk = compute_username_risk(username)
+@timed("analyze_edit")
+def analyze_edit(old_text, new_text, username, encode=encode_edit):
+    # Name-pattern score and edit history come from the editor profile cache
+    profile = get_profile(username)
+    editor = editor_summary(profile)
+
+    username_risk = {
+        "risk_score": profile["name_score"],
+        "reasons": profile["name_reasons"]
+    }
+
     content_risk = compute_content_risk(new_text)
 
+    # Kept for the embedding store when the model actually ran
+    embeddings = None
+
     # 🚀 FAST PATH — skip heavy NLP if edit is minor
     if is_minor_edit(old_text, new_text):
         similarity = 0.95
+    elif not old_text or not new_text:
+        similarity = 1.0
     else:
-        similarity = compute_semantic_similarity(old_text, new_text)
+        # `encode` may be swapped for a batched stage shared by several workers
+        encoded = encode(old_text, new_text)
+        similarity = similarity_from_embeddings(encoded)
+        embeddings = edit_vectors(encoded[0], encoded[1])
 
     semantic_risk = 1 - similarity
 
     final_risk = round(
         (semantic_risk * 0.4) +
         (content_risk["risk_score"] * 0.4) +
-        (username_risk["risk_score"] * 0.2),
+        (editor["risk_score"] * 0.2),
         3
     )
 
@@ -153,7 +181,9 @@ def analyze_edit(old_text, new_text, username):
     return {
         "semantic_similarity": similarity,
         "username_risk": username_risk,
+        "editor": editor,
         "content_risk": content_risk,
         "final_risk": final_risk,
-        "flagged": flagged
+        "flagged": flagged,
+        "embeddings": embeddings
     }
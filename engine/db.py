@@ -0,0 +1,219 @@
+import os, threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import OperationFailure
+
+# ---------------- CONFIG ---------------- #
+
+DB_NAME = os.getenv("INFOGUARD_DB", "infoguard")
+
+# "mongo" (MONGODB_URI) or "memory" (in-process mongomock, for tests and
+# benchmarks); more can be added with register_backend
+DB_BACKEND = os.getenv("INFOGUARD_DB_BACKEND", "mongo")
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("INFOGUARD_MONGO_POOL_SIZE", "50"))
+
+# ---------------- BACKENDS ---------------- #
+
+def mongo_backend():
+    uri = os.getenv("MONGODB_URI")
+
+    if not uri:
+        raise RuntimeError("MONGODB_URI not set")
+
+    return MongoClient(uri, maxPoolSize=MONGO_MAX_POOL_SIZE, appname="infoguard")
+
+class Serialized:
+    # mongomock is not thread-safe (concurrent writers break its dict
+    # iteration), so every call on the memory client, its databases,
+    # collections and cursors goes through one process-wide lock. Cursors
+    # are read out in full under the lock before being iterated.
+
+    _lock = threading.RLock()
+
+    def __init__(self, target):
+        self._target = target
+
+    @classmethod
+    def wrap(cls, value):
+        if type(value).__module__.startswith("mongomock"):
+            return cls(value)
+        return value
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+
+        if not callable(value):
+            return Serialized.wrap(value)
+
+        def call(*args, **kwargs):
+            with Serialized._lock:
+                return Serialized.wrap(value(*args, **kwargs))
+
+        return call
+
+    def __getitem__(self, key):
+        with Serialized._lock:
+            return Serialized.wrap(self._target[key])
+
+    def __iter__(self):
+        with Serialized._lock:
+            return iter(list(self._target))
+
+    def __next__(self):
+        with Serialized._lock:
+            return next(self._target)
+
+def memory_backend():
+    try:
+        import mongomock
+    except ImportError:
+        raise RuntimeError("The memory backend needs mongomock (pip install mongomock)")
+
+    return Serialized(mongomock.MongoClient())
+
+BACKENDS: Dict[str, Callable] = {
+    "mongo": mongo_backend,
+    "memory": memory_backend
+}
+
+def register_backend(name: str, factory: Callable):
+    # factory() returns a pymongo-compatible client
+    BACKENDS[name] = factory
+
+# ---------------- CLIENT ---------------- #
+
+_lock = threading.Lock()
+_state = {"backend": DB_BACKEND, "client": None}
+
+def get_client():
+    # Created on first use and shared by every module in the process
+    if _state["client"] is None:
+        with _lock:
+            if _state["client"] is None:
+                backend = _state["backend"]
+                if backend not in BACKENDS:
+                    raise RuntimeError(f"Unknown database backend: {backend}")
+                _state["client"] = BACKENDS[backend]()
+    return _state["client"]
+
+def get_db():
+    return get_client()[DB_NAME]
+
+def use_backend(name: str):
+    # Switches backend for the whole process; call before the first query
+    close()
+    _state["backend"] = name
+
+def close():
+    with _lock:
+        if _state["client"] is not None:
+            _state["client"].close()
+        _state["client"] = None
+
+class LazyCollection:
+    # Module-level handle that resolves to the shared client's collection
+    # on first attribute access, so importing a module opens nothing.
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
+
+def collection(name: str) -> LazyCollection:
+    return LazyCollection(name)
+
+def ensure_ttl_index(coll, field: str, seconds: int):
+    # Documents are removed by the server once `field` (a date) is older
+    # than `seconds`; documents without the field are kept. An existing
+    # index on the field has its expiry changed in place.
+    try:
+        coll.create_index([(field, ASCENDING)], expireAfterSeconds=seconds)
+    except OperationFailure:
+        get_db().command(
+            "collMod", coll.name,
+            index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds}
+        )
+
+pages = collection("pages")
+revisions = collection("revisions")
+analysis = collection("analysis")
+runs = collection("runs")
+topics = collection("topics")
+
+# ---------------- PAGES ---------------- #
+
+def get_page(title: str) -> Optional[dict]:
+    return pages.find_one({"_id": title})
+
+def add_page(title: str, last_revid: Optional[int] = None,
+             last_checked: Optional[datetime] = None, wiki: Optional[str] = None) -> bool:
+    # Upsert, so concurrent workers never insert the same page twice.
+    # Returns whether the page is new. `title` is the page key, prefixed
+    # with the wiki's namespace for every wiki but the default one.
+    result = pages.update_one(
+        {"_id": title},
+        {"$setOnInsert": {
+            "wiki": wiki,
+            "last_revid": last_revid,
+            "last_checked": last_checked,
+            "watch_status": "active",
+            "priority_score": 0
+        }},
+        upsert=True
+    )
+    return result.upserted_id is not None
+
+def mark_checked(title: str, revid: Optional[int] = None):
+    update = {"last_checked": datetime.utcnow()}
+
+    if revid is not None:
+        update["last_revid"] = revid
+
+    pages.update_one({"_id": title}, {"$set": update})
+
+# ---------------- REVISIONS ---------------- #
+
+def latest_revision(page: str) -> Optional[dict]:
+    return revisions.find_one({"page": page}, sort=[("timestamp", -1)])
+
+def insert_revision(doc: dict):
+    revisions.insert_one(doc)
+
+# ---------------- ANALYSIS ---------------- #
+
+def insert_analysis(doc: dict):
+    analysis.insert_one(doc)
+
+# ---------------- RUNS ---------------- #
+
+def save_run(doc: dict) -> bool:
+    # Upsert on _id: a stalled run may already have been recovered.
+    # recorded_at is the write time (exports pick up new runs by it).
+    # Returns whether a runs document with this _id already existed.
+    doc["recorded_at"] = datetime.utcnow()
+    result = runs.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+    return result.matched_count > 0
+
+def latest_run() -> Optional[dict]:
+    # Last run written; runs finish out of start order across workers
+    return runs.find_one(
+        {"timestamp": {"$exists": True}},
+        sort=[("recorded_at", -1), ("timestamp", -1)]
+    )
+
+# ---------------- TOPICS ---------------- #
+
+def load_topics() -> List[dict]:
+    return list(topics.find({}, {"_id": 0}))
+
+def replace_topics(records: List[dict]):
+    topics.delete_many({})
+
+    if records:
+        topics.insert_many(records)
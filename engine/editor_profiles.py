@@ -0,0 +1,221 @@
+import os, threading
+from collections import OrderedDict
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne, ReturnDocument
+from engine.db import collection
+
+editors = collection("editors")
+editor_pages = collection("editor_pages")
+analysis = collection("analysis")
+
+# ---------------- CONFIG ---------------- #
+
+EDITOR_CACHE_SIZE = int(os.getenv("INFOGUARD_EDITOR_CACHE_SIZE", "20000"))
+
+# Pseudo-edits at the prior flag rate; a new editor's reputation starts at
+# the prior and moves towards their own flag rate as edits accumulate
+REPUTATION_PRIOR_EDITS = 10
+REPUTATION_PRIOR_RATE = 0.05
+
+# Most weight reputation can take over the name-pattern score
+REPUTATION_MAX_WEIGHT = 0.5
+
+BATCH_SIZE = 1000
+
+# ---------------- LRU CACHE ---------------- #
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+def cache_get(username):
+    with _lock:
+        profile = _cache.get(username)
+        if profile is not None:
+            _cache.move_to_end(username)
+        return profile
+
+def cache_put(username, profile):
+    with _lock:
+        # concurrent record_edit calls can return their documents out of
+        # order; a later edit always has the higher edit_count
+        cached = _cache.get(username)
+        if cached is None or cached["edit_count"] <= profile["edit_count"]:
+            _cache[username] = profile
+        _cache.move_to_end(username)
+        while len(_cache) > EDITOR_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+# ---------------- PROFILES ---------------- #
+
+def name_risk(username):
+    from engine.core_engine import compute_username_risk
+    return compute_username_risk(username)
+
+def new_profile(username):
+    risk = name_risk(username)
+    return {
+        "_id": username,
+        "name_score": risk["risk_score"],
+        "name_reasons": risk["reasons"],
+        "edit_count": 0,
+        "flagged_count": 0,
+        "pages_touched": 0,
+        "first_seen": None,
+        "last_seen": None
+    }
+
+def get_profile(username):
+    # One cache hit, or a single Mongo read, per edit
+    profile = cache_get(username)
+
+    if profile is None:
+        profile = editors.find_one({"_id": username}) or new_profile(username)
+        cache_put(username, profile)
+
+    return profile
+
+def flagged_rate(profile):
+    return profile["flagged_count"] / profile["edit_count"] if profile["edit_count"] else 0.0
+
+def reputation_risk(profile):
+    # Flag rate shrunk towards the prior for editors with little history
+    return (
+        (profile["flagged_count"] + REPUTATION_PRIOR_EDITS * REPUTATION_PRIOR_RATE)
+        / (profile["edit_count"] + REPUTATION_PRIOR_EDITS)
+    )
+
+def editor_risk(profile):
+    # Name pattern for unknown editors, increasingly history for known ones
+    n = profile["edit_count"]
+    weight = REPUTATION_MAX_WEIGHT * n / (n + REPUTATION_PRIOR_EDITS)
+    return round((1 - weight) * profile["name_score"] + weight * reputation_risk(profile), 3)
+
+def editor_summary(profile):
+    return {
+        "edit_count": profile["edit_count"],
+        "flagged_rate": round(flagged_rate(profile), 3),
+        "pages_touched": profile["pages_touched"],
+        "first_seen": profile["first_seen"],
+        "reputation_risk": round(reputation_risk(profile), 3),
+        "risk_score": editor_risk(profile)
+    }
+
+# ---------------- INCREMENTAL UPDATES ---------------- #
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    editor_pages.create_index([("username", ASCENDING)])
+    _indexes_ready = True
+
+def record_edit(username, page, flagged, when=None):
+    ensure_indexes()
+
+    when = when or datetime.utcnow()
+    profile = get_profile(username)
+
+    # one small marker document per (editor, page) keeps the distinct-page
+    # count exact without an ever-growing array on the profile
+    new_page = editor_pages.update_one(
+        {"_id": f"{username}|{page}"},
+        {"$setOnInsert": {"username": username, "page": page, "first_seen": when}},
+        upsert=True
+    ).upserted_id is not None
+
+    increments = {
+        "edit_count": 1,
+        "flagged_count": int(bool(flagged)),
+        "pages_touched": int(new_page)
+    }
+
+    # The cache takes the stored profile as the $inc left it, so fetch
+    # threads (and other workers) recording the same editor never lose
+    # each other's counts
+    updated = editors.find_one_and_update(
+        {"_id": username},
+        {
+            "$setOnInsert": {"first_seen": when},
+            "$set": {
+                "name_score": profile["name_score"],
+                "name_reasons": profile["name_reasons"],
+                "last_seen": when
+            },
+            "$inc": increments
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+    cache_put(username, updated)
+
+    return updated
+
+# ---------------- REBUILD ---------------- #
+
+def rebuild_profiles():
+    # Recomputes every profile from the analysis history
+    ensure_indexes()
+    clear_cache()
+
+    analysis.aggregate([
+        {"$match": {"username": {"$exists": True}, "page": {"$exists": True}}},
+        {"$group": {
+            "_id": {"$concat": ["$username", "|", "$page"]},
+            "username": {"$first": "$username"},
+            "page": {"$first": "$page"},
+            "first_seen": {"$min": "$created_at"}
+        }},
+        {"$merge": {"into": editor_pages.name, "whenMatched": "replace"}}
+    ], allowDiskUse=True)
+
+    cursor = analysis.aggregate([
+        {"$match": {"username": {"$exists": True}}},
+        {"$group": {
+            "_id": "$username",
+            "edit_count": {"$sum": 1},
+            "flagged_count": {"$sum": {"$cond": ["$flagged", 1, 0]}},
+            "first_seen": {"$min": "$created_at"},
+            "last_seen": {"$max": "$created_at"}
+        }}
+    ], allowDiskUse=True)
+
+    pages_touched = {
+        d["_id"]: d["n"]
+        for d in editor_pages.aggregate([
+            {"$group": {"_id": "$username", "n": {"$sum": 1}}}
+        ], allowDiskUse=True)
+    }
+
+    ops = []
+    rebuilt = 0
+
+    for doc in cursor:
+        username = doc.pop("_id")
+        risk = name_risk(username)
+        doc.update(
+            name_score=risk["risk_score"],
+            name_reasons=risk["reasons"],
+            pages_touched=pages_touched.get(username, 0)
+        )
+        ops.append(UpdateOne({"_id": username}, {"$set": doc}, upsert=True))
+
+        if len(ops) >= BATCH_SIZE:
+            editors.bulk_write(ops, ordered=False)
+            rebuilt += len(ops)
+            ops = []
+
+    if ops:
+        editors.bulk_write(ops, ordered=False)
+        rebuilt += len(ops)
+
+    return rebuilt
+
+if __name__ == "__main__":
+    print("Editor profiles rebuilt:", rebuild_profiles())
@@ -0,0 +1,297 @@
+import os, threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from bson.binary import Binary
+from pymongo import ASCENDING
+from engine.db import collection
+
+edit_embeddings = collection("edit_embeddings")
+
+# ---------------- SCHEMA ---------------- #
+
+# Two vectors are kept per scored edit, both L2-normalised:
+#   content — embedding of the new revision text (what the page now says)
+#   change  — new minus old embedding (what the edit did to the page)
+SPACES = ["content", "change"]
+
+# A multilingual model (e.g. paraphrase-multilingual-MiniLM-L12-v2) lets
+# edits from different language wikis share one vector space. Vectors of
+# different models are never compared.
+EMBEDDING_MODEL = os.getenv("INFOGUARD_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DTYPE = np.float32
+
+BATCH_SIZE = 5000
+
+# Below this many vectors a query is a single exact matrix product
+IVF_MIN_VECTORS = int(os.getenv("INFOGUARD_IVF_MIN_VECTORS", "50000"))
+
+# Lists probed per query; more is slower and closer to exact
+IVF_NPROBE = int(os.getenv("INFOGUARD_IVF_NPROBE", "16"))
+
+KMEANS_SAMPLE = 20_000
+KMEANS_ITERATIONS = 10
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+
+    if _indexes_ready:
+        return
+
+    edit_embeddings.create_index([("page", ASCENDING), ("revid", ASCENDING)], unique=True)
+    edit_embeddings.create_index([("revid", ASCENDING)])
+    edit_embeddings.create_index([("created_at", ASCENDING)])
+
+    _indexes_ready = True
+
+def normalize(v):
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    return (v / np.where(norm == 0, 1, norm)).astype(EMBEDDING_DTYPE)
+
+# ---------------- WRITE ---------------- #
+
+def edit_vectors(old_embedding, new_embedding):
+    return {
+        "content": normalize(np.asarray(new_embedding)),
+        "change": normalize(np.asarray(new_embedding) - np.asarray(old_embedding))
+    }
+
+def record_edit_embedding(page, rev_info, analysis_result):
+    # Stores the vectors analyze_edit already computed; edits that took the
+    # minor-edit fast path have none and are skipped.
+    vectors = analysis_result.get("embeddings")
+
+    if vectors is None:
+        return False
+
+    ensure_indexes()
+
+    edit_embeddings.update_one(
+        {"page": page, "revid": rev_info["revid"]},
+        {"$setOnInsert": {
+            "username": rev_info["user"],
+            "created_at": datetime.utcnow(),
+            "final_risk": analysis_result["final_risk"],
+            "flagged": analysis_result["flagged"],
+            "model": EMBEDDING_MODEL,
+            **{s: Binary(vectors[s].tobytes()) for s in SPACES}
+        }},
+        upsert=True
+    )
+
+    return True
+
+# ---------------- COLUMNAR READS ---------------- #
+
+def unpack(blobs):
+    buffer = b"".join(blobs)
+    vectors = np.frombuffer(buffer, dtype=EMBEDDING_DTYPE)
+    return vectors.reshape(len(blobs), -1) if blobs else vectors.reshape(0, 0)
+
+def load_vectors(query=None, space="content", limit=None, sort=None,
+                 meta=("page", "revid", "created_at", "final_risk")):
+    # Stored vectors plus identifying fields, for the topic and anomaly
+    # engines to reuse instead of re-encoding text.
+    cursor = edit_embeddings.find(
+        query or {},
+        {space: 1, **{m: 1 for m in meta}}
+    ).batch_size(BATCH_SIZE)
+
+    if sort:
+        cursor = cursor.sort(sort)
+
+    if limit:
+        cursor = cursor.limit(limit)
+
+    docs = list(cursor)
+
+    V = unpack([d.pop(space) for d in docs])
+
+    return V, pd.DataFrame(docs, columns=["_id", *meta])
+
+# ---------------- ANN INDEX ---------------- #
+
+def kmeans(X, k, iterations=KMEANS_ITERATIONS, seed=42):
+    # Spherical k-means on unit vectors (cosine = dot product)
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), size=k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = np.argmax(X @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, X)
+        # empty cells keep their previous centroid
+        empty = np.bincount(assign, minlength=k) == 0
+        sums[empty] = centroids[empty]
+        centroids = normalize(sums)
+
+    return centroids
+
+class VectorIndex:
+    # Append-only in-memory index for one embedding space, refreshed from
+    # Mongo by _id watermark. Exact search while small; an inverted-file
+    # (IVF) index over k-means cells once past IVF_MIN_VECTORS, rebuilt
+    # whenever the collection has doubled since the last build.
+
+    def __init__(self, space):
+        self.space = space
+        self.vectors = np.empty((0, 0), dtype=EMBEDDING_DTYPE)
+        self.n = 0
+        self.revids = np.empty(0, dtype=np.int64)
+        self.pages = []
+        self.watermark = None
+        self.centroids = None
+        self.cells = None
+        self.built_at_n = 0
+        self.lock = threading.Lock()
+
+    def append(self, V, df):
+        if not len(V):
+            return
+
+        if self.n + len(V) > len(self.vectors):
+            capacity = max(2 * len(self.vectors), self.n + len(V), 1024)
+            grown = np.empty((capacity, V.shape[1]), dtype=EMBEDDING_DTYPE)
+            if self.n:
+                grown[:self.n] = self.vectors[:self.n]
+            self.vectors = grown
+
+        start = self.n
+        self.vectors[start:start + len(V)] = V
+        self.n += len(V)
+
+        self.revids = np.concatenate([self.revids, df["revid"].to_numpy(dtype=np.int64)])
+        self.pages.extend(df["page"].tolist())
+        self.watermark = df["_id"].iloc[-1]
+
+        if self.centroids is not None:
+            cells = np.argmax(V @ self.centroids.T, axis=1)
+            for c in np.unique(cells):
+                self.cells[c] = np.concatenate([self.cells[c], start + np.flatnonzero(cells == c)])
+
+    def refresh(self):
+        with self.lock:
+            query = {"model": EMBEDDING_MODEL}
+            if self.watermark:
+                query["_id"] = {"$gt": self.watermark}
+            V, df = load_vectors(query, self.space, sort=[("_id", 1)], meta=("page", "revid"))
+            self.append(V, df)
+
+            if self.n >= IVF_MIN_VECTORS and self.n >= 2 * self.built_at_n:
+                self.build()
+
+        return self
+
+    def build(self):
+        X = self.vectors[:self.n]
+        k = max(int(np.sqrt(self.n)), 1)
+
+        rng = np.random.default_rng(42)
+        sample = X[rng.choice(self.n, size=min(self.n, KMEANS_SAMPLE), replace=False)]
+        centroids = kmeans(sample, k)
+
+        assign = np.empty(self.n, dtype=np.int64)
+        for i in range(0, self.n, BATCH_SIZE):
+            assign[i:i + BATCH_SIZE] = np.argmax(X[i:i + BATCH_SIZE] @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(k + 1))
+
+        self.cells = [order[bounds[c]:bounds[c + 1]] for c in range(k)]
+        self.centroids = centroids
+        self.built_at_n = self.n
+
+    def candidates(self, q, nprobe):
+        if self.centroids is None:
+            return None
+        cells = np.argsort(-(self.centroids @ q))[:nprobe]
+        return np.concatenate([self.cells[c] for c in cells])
+
+    def search(self, q, k=10, nprobe=IVF_NPROBE, exclude_revid=None):
+        q = normalize(np.asarray(q, dtype=EMBEDDING_DTYPE))
+
+        with self.lock:
+            candidates = self.candidates(q, nprobe)
+            X = self.vectors[:self.n] if candidates is None else self.vectors[candidates]
+
+            if not len(X):
+                return []
+
+            scores = X @ q
+
+            if candidates is None:
+                candidates = np.arange(self.n)
+
+            if exclude_revid is not None:
+                scores = np.where(self.revids[candidates] == exclude_revid, -np.inf, scores)
+
+            top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+            top = top[np.argsort(-scores[top])]
+
+            return [
+                {
+                    "page": self.pages[candidates[i]],
+                    "revid": int(self.revids[candidates[i]]),
+                    "score": round(float(scores[i]), 4)
+                }
+                for i in top if np.isfinite(scores[i])
+            ]
+
+_indexes = {}
+
+def get_index(space="change"):
+    if space not in _indexes:
+        _indexes[space] = VectorIndex(space)
+    return _indexes[space].refresh()
+
+# ---------------- QUERIES ---------------- #
+
+def similar_to_revid(revid, k=10, space="change", page=None):
+    # revids repeat across wikis; pass the page key to disambiguate
+    query = {"revid": revid, "model": EMBEDDING_MODEL}
+    if page is not None:
+        query["page"] = page
+
+    doc = edit_embeddings.find_one(query, {space: 1})
+
+    if doc is None:
+        return []
+
+    q = np.frombuffer(doc[space], dtype=EMBEDDING_DTYPE)
+
+    return get_index(space).search(q, k, exclude_revid=revid)
+
+def similar_to_text(text, k=10):
+    # Free text is compared with what pages now say
+    from engine.core_engine import load_models
+
+    q = load_models().encode([text], normalize_embeddings=True, show_progress_bar=False)[0]
+
+    return get_index("content").search(q, k)
+
+if __name__ == "__main__":
+
+    import argparse, time
+
+    parser = argparse.ArgumentParser(description="Find edits similar to a revision or text")
+    parser.add_argument("query", help="revision id, or free text with --text")
+    parser.add_argument("--text", action="store_true")
+    parser.add_argument("--space", choices=SPACES, default="change")
+    parser.add_argument("--page", help="page key of the revision (needed with several wikis)")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    get_index("content" if args.text else args.space)
+    loaded = time.perf_counter()
+
+    results = (
+        similar_to_text(args.query, args.k) if args.text
+        else similar_to_revid(int(args.query), args.k, args.space, args.page)
+    )
+
+    print(f"index load {loaded - started:.2f}s, query {time.perf_counter() - loaded:.3f}s")
+    for r in results:
+        print(f"{r['score']:.4f}  {r['revid']:>12}  {r['page']}")
@@ -0,0 +1,329 @@
+import numpy as np
+import pandas as pd
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from bson.binary import Binary
+from pymongo import ASCENDING
+from engine.db import collection
+from engine.revision_archive import get_revision
+
+edit_features = collection("edit_features")
+analysis = collection("analysis")
+revisions = collection("revisions")
+
+# ---------------- SCHEMA ---------------- #
+
+# Order of the values packed into each record's `x` vector
+FEATURE_COLUMNS = [
+    "byte_delta",
+    "diff_size",
+    "username_score",
+    "lexicon_hits",
+    "similarity",
+    "hour_of_day",
+    "editor_edit_frequency",
+    "page_edit_velocity"
+]
+
+FEATURE_DTYPE = np.float32
+
+# Look-back used for editor frequency and page velocity
+ACTIVITY_WINDOW_HOURS = 24
+
+BATCH_SIZE = 5000
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+
+    if _indexes_ready:
+        return
+
+    edit_features.create_index([("username", ASCENDING), ("created_at", ASCENDING)])
+    edit_features.create_index([("page", ASCENDING), ("created_at", ASCENDING)])
+    edit_features.create_index([("created_at", ASCENDING)])
+
+    _indexes_ready = True
+
+# ---------------- FEATURE EXTRACTION ---------------- #
+
+def code_points(text):
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+def common_run(a, b):
+    # Length of the leading run where the two arrays agree
+    mismatch = np.flatnonzero(a != b)
+    return int(mismatch[0]) if mismatch.size else len(a)
+
+def diff_size(old_text, new_text):
+    # Size of the changed region once the common prefix and suffix are
+    # trimmed — a linear-time stand-in for a full diff. The texts are
+    # compared as code point arrays, so long articles stay out of a
+    # per-character Python loop.
+    old_text = old_text or ""
+    new_text = new_text or ""
+
+    if old_text == new_text:
+        return 0
+
+    a, b = code_points(old_text), code_points(new_text)
+    limit = min(len(a), len(b))
+
+    prefix = common_run(a[:limit], b[:limit])
+    rest = limit - prefix
+    suffix = common_run(a[::-1][:rest], b[::-1][:rest])
+
+    return max(len(a), len(b)) - prefix - suffix
+
+def parse_timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+
+def activity_counts(page, username, now):
+    cutoff = now - timedelta(hours=ACTIVITY_WINDOW_HOURS)
+
+    # both counts in one round trip; the $or is served by the username
+    # and page indexes
+    counts = next(edit_features.aggregate([
+        {"$match": {
+            "created_at": {"$gte": cutoff},
+            "$or": [{"username": username}, {"page": page}]
+        }},
+        {"$group": {
+            "_id": None,
+            "editor": {"$sum": {"$cond": [{"$eq": ["$username", username]}, 1, 0]}},
+            "page": {"$sum": {"$cond": [{"$eq": ["$page", page]}, 1, 0]}}
+        }}
+    ]), {"editor": 0, "page": 0})
+
+    return activity_features(counts["editor"], counts["page"])
+
+def activity_features(editor_edits, page_edits):
+    # include the edit being recorded
+    return editor_edits + 1, (page_edits + 1) / ACTIVITY_WINDOW_HOURS
+
+def build_features(old_text, new_text, rev_info, analysis_result, activity):
+    editor_freq, page_velocity = activity
+
+    values = {
+        "byte_delta": len((new_text or "").encode()) - len((old_text or "").encode()),
+        "diff_size": diff_size(old_text, new_text),
+        "username_score": analysis_result["username_risk"]["risk_score"],
+        "lexicon_hits": len(analysis_result["content_risk"]["risk_words"]),
+        "similarity": analysis_result["semantic_similarity"],
+        "hour_of_day": parse_timestamp(rev_info["timestamp"]).hour,
+        "editor_edit_frequency": editor_freq,
+        "page_edit_velocity": page_velocity
+    }
+
+    return np.array([values[c] for c in FEATURE_COLUMNS], dtype=FEATURE_DTYPE)
+
+# ---------------- WRITE ---------------- #
+
+def record_edit_features(page, old_text, new_text, rev_info, analysis_result):
+    ensure_indexes()
+
+    now = datetime.utcnow()
+
+    activity = activity_counts(page, rev_info["user"], now)
+    vector = build_features(old_text, new_text, rev_info, analysis_result, activity)
+
+    edit_features.insert_one({
+        "page": page,
+        "revid": rev_info["revid"],
+        "username": rev_info["user"],
+        "created_at": now,
+        "final_risk": analysis_result["final_risk"],
+        "flagged": analysis_result["flagged"],
+        "x": Binary(vector.tobytes())
+    })
+
+    return vector
+
+# ---------------- BACKFILL ---------------- #
+
+# One-off: features for the analysis history written before the store
+# existed, rebuilt from the stored revisions. Activity counts come from
+# sliding windows over the replayed history instead of per-edit queries.
+# Resumable: backfilled records are marked, and a rerun continues after the
+# newest one (replaying one window earlier to refill the counts).
+
+def revision_texts(docs):
+    # (page, revid) -> (text, timestamp, previous text) for a chunk of
+    # analysis documents, hot tier first, then the archive
+    revs = {
+        (r["page"], r["revid"]): r
+        for r in revisions.find({"revid": {"$in": [d["revid"] for d in docs]}})
+    }
+
+    texts = {}
+
+    for d in docs:
+        key = (d["page"], d["revid"])
+        rev = revs.get(key) or get_revision(*key)
+
+        if rev is None:
+            continue
+
+        previous = None
+        if rev.get("previous_revid") is not None:
+            previous = get_revision(d["page"], rev["previous_revid"])
+
+        texts[key] = (
+            rev.get("clean_content"),
+            rev["timestamp"],
+            previous.get("clean_content") if previous else None
+        )
+
+    return texts
+
+def backfill(chunk_size=BATCH_SIZE):
+    ensure_indexes()
+
+    # stop where live recording took over
+    first_live = edit_features.find_one({"backfilled": {"$ne": True}}, sort=[("created_at", 1)])
+    last_done = edit_features.find_one({"backfilled": True}, sort=[("created_at", -1)])
+
+    query = {"created_at": {"$exists": True}}
+
+    if first_live is not None:
+        query["created_at"] = {"$lt": first_live["created_at"]}
+
+    resume_after = last_done["created_at"] if last_done else None
+
+    if resume_after is not None:
+        query["created_at"] = {
+            **query["created_at"],
+            "$gte": resume_after - timedelta(hours=ACTIVITY_WINDOW_HOURS)
+        }
+
+    cursor = analysis.find(
+        query,
+        {"page": 1, "revid": 1, "username": 1, "final_risk": 1, "flagged": 1,
+         "semantic_similarity": 1, "username_risk": 1, "content_risk": 1, "created_at": 1}
+    ).sort("created_at", 1).batch_size(chunk_size)
+
+    window = timedelta(hours=ACTIVITY_WINDOW_HOURS)
+    by_editor = defaultdict(deque)
+    by_page = defaultdict(deque)
+
+    def seen_within(times, now):
+        while times and times[0] < now - window:
+            times.popleft()
+        return len(times)
+
+    stats = {"backfilled": 0, "missing_revisions": 0}
+    chunk = []
+
+    def flush():
+        texts = revision_texts([d for d, _ in chunk])
+        records = []
+
+        for d, activity in chunk:
+            key = (d["page"], d["revid"])
+
+            if key not in texts:
+                stats["missing_revisions"] += 1
+                continue
+
+            new_text, timestamp, old_text = texts[key]
+            vector = build_features(
+                old_text, new_text, {"timestamp": timestamp}, d, activity
+            )
+
+            records.append({
+                "page": d["page"],
+                "revid": d["revid"],
+                "username": d["username"],
+                "created_at": d["created_at"],
+                "final_risk": d["final_risk"],
+                "flagged": d["flagged"],
+                "x": Binary(vector.tobytes()),
+                "backfilled": True
+            })
+
+        if records:
+            edit_features.insert_many(records)
+            stats["backfilled"] += len(records)
+
+        chunk.clear()
+
+    for d in cursor:
+        now = d["created_at"]
+
+        activity = activity_features(
+            seen_within(by_editor[d["username"]], now),
+            seen_within(by_page[d["page"]], now)
+        )
+
+        by_editor[d["username"]].append(now)
+        by_page[d["page"]].append(now)
+
+        # the replayed window before the resume point only refills counts
+        if resume_after is not None and now <= resume_after:
+            continue
+
+        chunk.append((d, activity))
+
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+
+    return stats
+
+# ---------------- COLUMNAR READS ---------------- #
+
+def unpack(blobs):
+    # One contiguous buffer -> (n, len(FEATURE_COLUMNS)) matrix
+    buffer = b"".join(blobs)
+    return np.frombuffer(buffer, dtype=FEATURE_DTYPE).reshape(-1, len(FEATURE_COLUMNS))
+
+def column_index(columns):
+    return [FEATURE_COLUMNS.index(c) for c in columns]
+
+def load_matrix(query=None, columns=None, limit=None, sort=None):
+    cursor = edit_features.find(query or {}, {"_id": 0, "x": 1}).batch_size(BATCH_SIZE)
+
+    if sort:
+        cursor = cursor.sort(sort)
+
+    if limit:
+        cursor = cursor.limit(limit)
+
+    X = unpack([d["x"] for d in cursor])
+
+    if columns:
+        X = X[:, column_index(columns)]
+
+    return X
+
+def load_frame(query=None, columns=None, limit=None, sort=None,
+               meta=("page", "revid", "created_at", "final_risk")):
+    # Matrix plus the identifying fields, for consumers that need to write
+    # results back against a page/revision.
+    cursor = edit_features.find(
+        query or {},
+        {"x": 1, **{m: 1 for m in meta}}
+    ).batch_size(BATCH_SIZE)
+
+    if sort:
+        cursor = cursor.sort(sort)
+
+    if limit:
+        cursor = cursor.limit(limit)
+
+    docs = list(cursor)
+
+    X = unpack([d.pop("x") for d in docs])
+
+    if columns:
+        X = X[:, column_index(columns)]
+
+    return X, pd.DataFrame(docs, columns=["_id", *meta])
+
+if __name__ == "__main__":
+    print(backfill())
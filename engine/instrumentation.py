@@ -0,0 +1,70 @@
+import time
+import threading
+import numpy as np
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+# ---------------- STAGE TIMERS ---------------- #
+
+# Per-process durations (seconds) keyed by stage name. Stage names are
+# used as Mongo field names, so they must not contain "." or start with "$".
+
+_lock = threading.Lock()
+_durations = defaultdict(list)
+
+# Stages currently open, per thread id (read by the profiler's sampler)
+_active = defaultdict(list)
+
+def record(stage, seconds):
+    with _lock:
+        _durations[stage].append(seconds)
+
+@contextmanager
+def span(stage):
+    stack = _active[threading.get_ident()]
+    stack.append(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+        stack.pop()
+
+def active_stages(thread_id):
+    return list(_active.get(thread_id, ()))
+
+def timed(stage):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def reset():
+    with _lock:
+        _durations.clear()
+
+# ---------------- SUMMARY ---------------- #
+
+def stage_summary():
+    with _lock:
+        snapshot = {k: np.array(v) for k, v in _durations.items() if v}
+
+    summary = {}
+
+    for stage, values in snapshot.items():
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+
+        summary[stage] = {
+            "count": int(values.size),
+            "total_seconds": round(float(values.sum()), 4),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(values.max()) * 1000, 2)
+        }
+
+    return summary
@@ -1,65 +1,88 @@
 import pandas as pd
-from pymongo import MongoClient
-import os
-
-MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
-db = client["infoguard"]
-
-analysis = db["analysis"]
-anomalies = db["anomalies"]
-
-def compute_priority():
-    docs = list(analysis.find())
-
-    cleaned = []
-    for d in docs:
-        if "page" in d and "final_risk" in d:
-            cleaned.append(d)
-
-    if not cleaned:
+from engine.db import collection
+from engine.anomaly_detection import ensure_indexes as ensure_anomaly_indexes
+
+analysis = collection("analysis")
+anomalies = collection("anomalies")
+
+FEATURE_FIELDS = [
+    "page", "avg_risk", "max_risk", "edit_volume",
+    "flag_rate", "anomaly_count", "edit_velocity", "priority_score"
+]
+
+def priority_pipeline(top_n=50, since=None):
+    # Everything runs server-side: per-page aggregates, anomaly counts via
+    # $lookup, volume normalization via $setWindowFields, then top-N only.
+    # ($setWindowFields and $lookup with localField + pipeline need MongoDB 5.0+)
+    match = {
+        "page": {"$exists": True},
+        "final_risk": {"$exists": True}
+    }
+
+    if since is not None:
+        match["created_at"] = {"$gte": since}
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$page",
+            "avg_risk": {"$avg": "$final_risk"},
+            "max_risk": {"$max": "$final_risk"},
+            "edit_volume": {"$sum": 1},
+            "flag_rate": {"$avg": {"$cond": ["$flagged", 1, 0]}}
+        }},
+        {"$lookup": {
+            "from": anomalies.name,
+            "localField": "_id",
+            "foreignField": "page",
+            "pipeline": [{"$count": "n"}],
+            "as": "anomaly"
+        }},
+        {"$set": {
+            "anomaly_count": {"$ifNull": [{"$first": "$anomaly.n"}, 0]}
+        }},
+        # normalize volume
+        {"$setWindowFields": {
+            "output": {
+                "max_volume": {
+                    "$max": "$edit_volume",
+                    "window": {"documents": ["unbounded", "unbounded"]}
+                }
+            }
+        }},
+        {"$set": {
+            "edit_velocity": {"$divide": ["$edit_volume", "$max_volume"]}
+        }},
+        # intelligent weighted score
+        {"$set": {
+            "priority_score": {"$add": [
+                {"$multiply": [0.35, "$avg_risk"]},
+                {"$multiply": [0.25, "$max_risk"]},
+                {"$multiply": [0.2, "$flag_rate"]},
+                {"$multiply": [0.1, "$anomaly_count"]},
+                {"$multiply": [0.1, "$edit_velocity"]}
+            ]}
+        }},
+        {"$sort": {"priority_score": -1, "_id": 1}}
+    ]
+
+    if top_n:
+        pipeline.append({"$limit": top_n})
+
+    pipeline.append({"$project": {
+        "_id": 0,
+        "page": "$_id",
+        **{f: 1 for f in FEATURE_FIELDS if f != "page"}
+    }})
+
+    return pipeline
+
+def compute_priority(top_n=50, since=None):
+    ensure_anomaly_indexes()
+
+    docs = list(analysis.aggregate(priority_pipeline(top_n, since), allowDiskUse=True))
+
+    if not docs:
         return pd.DataFrame()
 
-    df = pd.DataFrame(cleaned)
-
-    if "flagged" not in df.columns:
-        df["flagged"] = False
-
-    df["created_at"] = pd.to_datetime(df.get("created_at", pd.Timestamp.utcnow()))
-
-    grouped = df.groupby("page")
-
-    features = grouped.agg(
-        avg_risk=("final_risk", "mean"),
-        max_risk=("final_risk", "max"),
-        edit_volume=("final_risk", "count"),
-        flag_rate=("flagged", "mean")
-    ).reset_index()
-
-    anomaly_counts = pd.DataFrame(
-        anomalies.aggregate([
-            {"$group": {"_id": "$page", "count": {"$sum": 1}}}
-        ])
-    )
-
-    if not anomaly_counts.empty:
-        anomaly_counts.columns = ["page", "anomaly_count"]
-        features = features.merge(anomaly_counts, on="page", how="left")
-    else:
-        features["anomaly_count"] = 0
-
-    features["anomaly_count"] = features["anomaly_count"].fillna(0)
-
-    # normalize volume
-    features["edit_velocity"] = features["edit_volume"] / features["edit_volume"].max()
-
-    # intelligent weighted score
-    features["priority_score"] = (
-        0.35 * features["avg_risk"] +
-        0.25 * features["max_risk"] +
-        0.2 * features["flag_rate"] +
-        0.1 * features["anomaly_count"] +
-        0.1 * features["edit_velocity"]
-    )
-
-    return features.sort_values("priority_score", ascending=False)
+    return pd.DataFrame(docs, columns=FEATURE_FIELDS)
@@ -0,0 +1,180 @@
+import os
+import sys
+import time
+import resource
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime
+from engine.instrumentation import active_stages
+
+# ---------------- CONFIG ---------------- #
+
+# Opt-in: INFOGUARD_PROFILE=1 enables sampling for a monitoring run
+PROFILE_ENABLED = os.getenv("INFOGUARD_PROFILE", "0") == "1"
+
+# Also trace Python allocations (adds noticeable overhead)
+PROFILE_TRACEMALLOC = os.getenv("INFOGUARD_PROFILE_TRACEMALLOC", "0") == "1"
+
+PROFILE_DIR = os.getenv("INFOGUARD_PROFILE_DIR", "profiles")
+
+PROFILE_INTERVAL_MS = int(os.getenv("INFOGUARD_PROFILE_INTERVAL_MS", "10"))
+
+TOP_N = 15
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# ---------------- MEMORY ---------------- #
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1024 ** 2
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+# ---------------- SAMPLER ---------------- #
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def collapse_stack(frame):
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+class Profiler:
+    # Samples the Python stack of every thread (fetch pools, embedding
+    # stage, main) every PROFILE_INTERVAL_MS, prefixing each stack with its
+    # thread name, and attributes RSS to whichever instrumentation stages
+    # are open in any thread at the time.
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS, trace_malloc=PROFILE_TRACEMALLOC):
+        self.interval = interval_ms / 1000
+        self.trace_malloc = trace_malloc
+        self.stacks = Counter()
+        self.stage_peak_rss = defaultdict(float)
+        self.peak_rss = 0.0
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        if self.trace_malloc:
+            tracemalloc.start()
+        self.started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stages = set()
+
+            for ident, frame in sys._current_frames().items():
+
+                if ident == self._thread.ident:
+                    continue
+
+                name = names.get(ident, str(ident))
+                self.stacks[f"{name};{collapse_stack(frame)}"] += 1
+                self.samples += 1
+
+                stages.update(active_stages(ident))
+
+            rss = current_rss_mb()
+            self.peak_rss = max(self.peak_rss, rss)
+
+            for stage in stages or ["unstaged"]:
+                self.stage_peak_rss[stage] = max(self.stage_peak_rss[stage], rss)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started_at
+
+        self.malloc_peak = None
+        self.top_allocations = []
+
+        if self.trace_malloc:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.malloc_peak = peak / 1024 ** 2
+            self.top_allocations = [
+                {
+                    "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_mb": round(stat.size / 1024 ** 2, 3)
+                }
+                for stat in snapshot.statistics("lineno")[:TOP_N]
+            ]
+
+        return self
+
+    # ---------------- OUTPUT ---------------- #
+
+    def write_collapsed(self, path):
+        # Brendan Gregg's folded format: flamegraph.pl, speedscope, inferno
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def top_functions(self):
+        # Self samples per leaf frame
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+
+        total = max(self.samples, 1)
+
+        return [
+            {"frame": frame, "samples": count, "pct": round(count / total * 100, 2)}
+            for frame, count in leaves.most_common(TOP_N)
+        ]
+
+    def summary(self, profile_path=None):
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "peak_rss_mb": round(max(self.peak_rss, peak_rss_mb()), 1),
+            "stage_peak_rss_mb": {
+                k: round(v, 1) for k, v in self.stage_peak_rss.items()
+            },
+            "top_functions": self.top_functions(),
+            "tracemalloc_peak_mb": (
+                round(self.malloc_peak, 1) if self.malloc_peak is not None else None
+            ),
+            "top_allocations": self.top_allocations,
+            "profile_path": profile_path
+        }
+
+# ---------------- ENTRY POINT HELPERS ---------------- #
+
+def start_profiling():
+    if not PROFILE_ENABLED:
+        return None
+    return Profiler().start()
+
+def finish_profiling(profiler):
+    if profiler is None:
+        return None
+
+    profiler.stop()
+
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    path = profiler.write_collapsed(os.path.join(PROFILE_DIR, f"run-{stamp}.folded"))
+
+    return profiler.summary(path)
@@ -0,0 +1,260 @@
+import os, lzma
+from datetime import datetime
+from pathlib import Path
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from engine.db import collection
+
+revisions = collection("revisions")
+revision_archive = collection("revision_archive")
+
+# ---------------- CONFIG ---------------- #
+
+# Newest revisions per page kept in Mongo; monitoring only ever reads the
+# latest one, the rest are for history lookups
+REVISIONS_KEEP_PER_PAGE = max(1, int(os.getenv("INFOGUARD_REVISIONS_KEEP", "5")))
+
+ARCHIVE_DIR = Path(os.getenv("INFOGUARD_ARCHIVE_DIR", "archive"))
+
+# A new segment file is started once the current one passes this size
+ARCHIVE_SEGMENT_BYTES = int(os.getenv("INFOGUARD_ARCHIVE_SEGMENT_MB", "256")) * 1024 * 1024
+
+# Pages archived per flush (fsync, index write, delete from Mongo)
+ARCHIVE_FLUSH_PAGES = 200
+
+# Successive revisions of a page are near-identical full texts. Compressing
+# them as one xz block lets the large LZMA window store the shared text
+# once, which a per-record gzip (32 KB window) cannot do for long articles.
+LZMA_PRESET = 6
+
+# ---------------- INDEXES ---------------- #
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+
+    if _indexes_ready:
+        return
+
+    # also serves latest_revision()
+    revisions.create_index([("page", ASCENDING), ("timestamp", DESCENDING)])
+    revisions.create_index([("revid", ASCENDING)])
+    revision_archive.create_index([("page", ASCENDING), ("timestamp", DESCENDING)])
+
+    _indexes_ready = True
+
+def archive_key(page, revid):
+    return f"{page}|{revid}"
+
+# ---------------- SEGMENTS ---------------- #
+
+# Segments are concatenated .xz streams, one per page and archive pass,
+# each holding that page's revisions as JSON lines. `xz -dc` reads a whole
+# segment; the index in Mongo stores where each page block starts.
+
+def encode_block(docs):
+    lines = "".join(json_util.dumps(d) + "\n" for d in docs)
+    return lzma.compress(lines.encode("utf-8"), preset=LZMA_PRESET)
+
+def read_block(segment, offset, length, root=ARCHIVE_DIR):
+    with open(root / segment, "rb") as f:
+        f.seek(offset)
+        data = lzma.decompress(f.read(length))
+
+    return [json_util.loads(line) for line in data.decode("utf-8").splitlines()]
+
+class SegmentWriter:
+    # Appends page blocks to the current segment, rolling to a new file
+    # past ARCHIVE_SEGMENT_BYTES. Nothing is indexed or deleted from Mongo
+    # until sync() has the blocks on disk.
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.file = None
+        self.name = None
+
+    def open_segment(self):
+        self.close()
+        self.name = f"revisions-{datetime.utcnow():%Y%m%dT%H%M%S%f}.jsonl.xz"
+        self.file = open(self.root / self.name, "ab")
+
+    def write(self, block):
+        if self.file is None or self.file.tell() >= ARCHIVE_SEGMENT_BYTES:
+            self.open_segment()
+
+        offset = self.file.tell()
+        self.file.write(block)
+
+        return self.name, offset
+
+    def sync(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+# ---------------- ARCHIVE ---------------- #
+
+def pages_over_limit(keep):
+    return [
+        d["_id"]
+        for d in revisions.aggregate([
+            {"$group": {"_id": "$page", "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": keep}}}
+        ], allowDiskUse=True)
+    ]
+
+def cold_revisions(page, keep):
+    # Everything but the newest `keep`, oldest first
+    ids = [
+        d["_id"]
+        for d in revisions.find({"page": page}, {"_id": 1})
+        .sort("timestamp", DESCENDING).skip(keep)
+    ]
+
+    if not ids:
+        return []
+
+    return list(revisions.find({"_id": {"$in": ids}}).sort("timestamp", ASCENDING))
+
+def flush(writer, pending):
+    writer.sync()
+
+    revision_archive.bulk_write(
+        [op for ops, _ in pending for op in ops], ordered=False
+    )
+    revisions.delete_many({"_id": {"$in": [i for _, ids in pending for i in ids]}})
+
+    pending.clear()
+
+def archive_revisions(keep=REVISIONS_KEEP_PER_PAGE, root=ARCHIVE_DIR):
+    # Moves all but the newest `keep` revisions of every page into the
+    # local archive. Safe to interrupt: revisions leave Mongo only after
+    # their block is synced and indexed, so a crash at worst archives a
+    # block twice (the index then points at the later copy).
+    ensure_indexes()
+
+    keep = max(1, keep)
+    writer = SegmentWriter(root)
+    pending = []
+    archived = 0
+    now = datetime.utcnow()
+
+    try:
+        for page in pages_over_limit(keep):
+            docs = cold_revisions(page, keep)
+
+            if not docs:
+                continue
+
+            block = encode_block(docs)
+            segment, offset = writer.write(block)
+
+            ops = [
+                UpdateOne(
+                    {"_id": archive_key(page, d["revid"])},
+                    {"$set": {
+                        "page": page,
+                        "revid": d["revid"],
+                        "timestamp": d.get("timestamp"),
+                        "segment": segment,
+                        "offset": offset,
+                        "length": len(block),
+                        "archived_at": now
+                    }},
+                    upsert=True
+                )
+                for d in docs
+            ]
+
+            pending.append((ops, [d["_id"] for d in docs]))
+            archived += len(docs)
+
+            if len(pending) >= ARCHIVE_FLUSH_PAGES:
+                flush(writer, pending)
+
+        if pending:
+            flush(writer, pending)
+
+    finally:
+        writer.close()
+
+    return archived
+
+# ---------------- RESTORE ---------------- #
+
+def load_archived(page, revid, root=ARCHIVE_DIR):
+    entry = revision_archive.find_one({"_id": archive_key(page, revid)})
+
+    if entry is None:
+        return None
+
+    for doc in read_block(entry["segment"], entry["offset"], entry["length"], root):
+        if doc["revid"] == revid:
+            return doc
+
+    return None
+
+def get_revision(page, revid, root=ARCHIVE_DIR):
+    # Hot tier first, then the archive
+    return (
+        revisions.find_one({"page": page, "revid": revid})
+        or load_archived(page, revid, root)
+    )
+
+def restore_revisions(page, revids=None, root=ARCHIVE_DIR):
+    # Copies archived revisions of a page back into Mongo (all of them when
+    # `revids` is None). A later archive pass moves them out again if they
+    # are still beyond the retention limit.
+    query = {"page": page}
+
+    if revids is not None:
+        query["revid"] = {"$in": list(revids)}
+
+    wanted = {}
+    for entry in revision_archive.find(query):
+        wanted.setdefault((entry["segment"], entry["offset"], entry["length"]), set()).add(entry["revid"])
+
+    restored = []
+    for (segment, offset, length), ids in wanted.items():
+        restored += [d for d in read_block(segment, offset, length, root) if d["revid"] in ids]
+
+    if not restored:
+        return 0
+
+    revisions.bulk_write([
+        UpdateOne(
+            {"_id": d["_id"]},
+            {"$setOnInsert": {k: v for k, v in d.items() if k != "_id"}},
+            upsert=True
+        )
+        for d in restored
+    ], ordered=False)
+
+    revision_archive.delete_many({"_id": {"$in": [archive_key(page, d["revid"]) for d in restored]}})
+
+    return len(restored)
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archive old revisions, or restore them")
+    parser.add_argument("--keep", type=int, default=REVISIONS_KEEP_PER_PAGE,
+                        help="newest revisions per page to keep in MongoDB")
+    parser.add_argument("--restore", metavar="PAGE", help="restore a page's archived revisions")
+    parser.add_argument("--revid", type=int, nargs="*", help="only these revisions (with --restore)")
+    args = parser.parse_args()
+
+    if args.restore:
+        print("Revisions restored:", restore_revisions(args.restore, args.revid))
+    else:
+        print("Revisions archived:", archive_revisions(args.keep))
+        print("Archive directory:", ARCHIVE_DIR.resolve())
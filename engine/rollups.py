@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne, ASCENDING
+from engine.db import collection
+
+analysis = collection("analysis")
+runs = collection("runs")
+rollups = collection("rollups")
+
+# ---------------- CONFIG ---------------- #
+
+GRANULARITIES = ["hour", "day"]
+
+GLOBAL_SCOPE = "__global__"
+
+ANALYSIS_METRICS = ["final_risk"]
+RUN_METRICS = [
+    "pages_checked", "changes_detected", "flagged",
+    "duration_seconds", "pages_per_minute", "peak_rss_mb"
+]
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+
+    if _indexes_ready:
+        return
+
+    rollups.create_index([
+        ("metric", ASCENDING), ("granularity", ASCENDING),
+        ("scope", ASCENDING), ("bucket", ASCENDING)
+    ])
+
+    _indexes_ready = True
+
+# ---------------- BUCKETS ---------------- #
+
+def bucket_start(ts, granularity):
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def bucket_id(metric, granularity, bucket, scope):
+    return f"{metric}|{granularity}|{bucket.isoformat()}|{scope}"
+
+def bucket_updates(metric, value, ts, scopes, flagged=False):
+    value = float(value)
+
+    return [
+        UpdateOne(
+            {"_id": bucket_id(metric, g, bucket_start(ts, g), scope)},
+            {
+                "$setOnInsert": {
+                    "metric": metric,
+                    "granularity": g,
+                    "bucket": bucket_start(ts, g),
+                    "scope": scope,
+                    "page": None if scope == GLOBAL_SCOPE else scope
+                },
+                "$inc": {
+                    "count": 1,
+                    "sum": value,
+                    "sumsq": value * value,
+                    "flagged": int(bool(flagged))
+                },
+                "$max": {"max": value},
+                "$min": {"min": value}
+            },
+            upsert=True
+        )
+        for g in GRANULARITIES
+        for scope in scopes
+    ]
+
+# ---------------- WRITE PATH ---------------- #
+
+def record_analysis(doc):
+    ensure_indexes()
+
+    ops = []
+    for metric in ANALYSIS_METRICS:
+        if doc.get(metric) is None:
+            continue
+        ops += bucket_updates(
+            metric, doc[metric], doc["created_at"],
+            (doc["page"], GLOBAL_SCOPE), doc.get("flagged", False)
+        )
+
+    if ops:
+        rollups.bulk_write(ops, ordered=False)
+
+def record_run(doc):
+    ensure_indexes()
+
+    doc = dict(doc)
+
+    if doc.get("duration_seconds"):
+        doc["pages_per_minute"] = doc["pages_checked"] / (doc["duration_seconds"] / 60)
+
+    ops = []
+    for metric in RUN_METRICS:
+        if doc.get(metric) is None:
+            continue
+        ops += bucket_updates(metric, doc[metric], doc["timestamp"], (GLOBAL_SCOPE,))
+
+    if ops:
+        rollups.bulk_write(ops, ordered=False)
+
+# ---------------- REBUILD ---------------- #
+
+def rebuild_pipeline(metric, granularity, time_field, by_page, flag_field, since):
+    match = {metric: {"$exists": True, "$ne": None}, time_field: {"$exists": True}}
+    if since is not None:
+        match[time_field] = {"$gte": since}
+
+    scope = "$page" if by_page else GLOBAL_SCOPE
+    bucket = {"$dateTrunc": {"date": f"${time_field}", "unit": granularity}}
+    flagged = {"$cond": [f"${flag_field}", 1, 0]} if flag_field else 0
+
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"bucket": bucket, "scope": scope},
+            "count": {"$sum": 1},
+            "sum": {"$sum": f"${metric}"},
+            "sumsq": {"$sum": {"$multiply": [f"${metric}", f"${metric}"]}},
+            "max": {"$max": f"${metric}"},
+            "min": {"$min": f"${metric}"},
+            "flagged": {"$sum": flagged}
+        }},
+        {"$project": {
+            "_id": {"$concat": [
+                metric, "|", granularity, "|",
+                {"$dateToString": {"date": "$_id.bucket", "format": "%Y-%m-%dT%H:%M:%S"}},
+                "|", "$_id.scope"
+            ]},
+            "metric": metric,
+            "granularity": granularity,
+            "bucket": "$_id.bucket",
+            "scope": "$_id.scope",
+            "page": {"$cond": [{"$eq": ["$_id.scope", GLOBAL_SCOPE]}, None, "$_id.scope"]},
+            "count": 1, "sum": 1, "sumsq": 1, "max": 1, "min": 1, "flagged": 1
+        }},
+        {"$merge": {"into": rollups.name, "whenMatched": "replace"}}
+    ]
+
+def rebuild_rollups(since=None):
+    # Recomputes buckets from raw history entirely on the server
+    # ($dateTrunc needs MongoDB 5.0+). `since` should fall on a day boundary
+    # so that partially covered buckets are not overwritten.
+    ensure_indexes()
+
+    for g in GRANULARITIES:
+
+        for metric in ANALYSIS_METRICS:
+            for by_page in (True, False):
+                analysis.aggregate(
+                    rebuild_pipeline(metric, g, "created_at", by_page, "flagged", since),
+                    allowDiskUse=True
+                )
+
+        for metric in RUN_METRICS:
+            pipeline = rebuild_pipeline(metric, g, "timestamp", False, None, since)
+            if metric == "pages_per_minute":
+                # derived per run, as in record_run
+                pipeline.insert(0, {"$set": {"pages_per_minute": {"$cond": [
+                    {"$gt": ["$duration_seconds", 0]},
+                    {"$divide": ["$pages_checked", {"$divide": ["$duration_seconds", 60]}]},
+                    None
+                ]}}})
+            runs.aggregate(pipeline, allowDiskUse=True)
+
+# ---------------- READ PATH ---------------- #
+
+def load_series(metric, granularity="hour", page=None, since=None):
+    query = {
+        "metric": metric,
+        "granularity": granularity,
+        "scope": page if page is not None else GLOBAL_SCOPE
+    }
+
+    if since is not None:
+        query["bucket"] = {"$gte": bucket_start(since, granularity)}
+
+    df = pd.DataFrame(
+        list(rollups.find(
+            query,
+            {"_id": 0, "bucket": 1, "count": 1, "sum": 1, "sumsq": 1,
+             "max": 1, "min": 1, "flagged": 1}
+        ).sort("bucket", 1)),
+        columns=["bucket", "count", "sum", "sumsq", "max", "min", "flagged"]
+    )
+
+    return with_stats(df)
+
+def with_stats(df):
+    df["bucket"] = pd.to_datetime(df["bucket"])
+    df["mean"] = df["sum"] / df["count"]
+    var = (df["sumsq"] / df["count"]) - df["mean"] ** 2
+    df["std"] = np.sqrt(var.clip(lower=0))
+    return df
+
+def resample_series(df, rule):
+    # Merge rollup buckets into coarser ones (e.g. "6h") without touching raw data
+    if df.empty:
+        return df
+
+    merged = (
+        df.set_index("bucket")
+        .resample(rule)
+        .agg({"count": "sum", "sum": "sum", "sumsq": "sum",
+              "max": "max", "min": "min", "flagged": "sum"})
+    )
+    merged = merged[merged["count"] > 0].reset_index()
+
+    return with_stats(merged)
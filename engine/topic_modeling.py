@@ -1,22 +1,10 @@
-from bertopic import BERTopic
-from sentence_transformers import SentenceTransformer
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, CountVectorizer
-from pymongo import MongoClient
-import os
+from engine.instrumentation import timed
+from engine.embedding_store import EMBEDDING_MODEL, load_vectors
+from engine.core_engine import encode_texts
+from engine.db import collection, replace_topics
 
-MONGO_URI = os.getenv("MONGODB_URI")
-
-client = MongoClient(MONGO_URI)
-
-db = client["infoguard"]
-
-analysis = db["analysis"]
-
-topics_collection = db["topics"]
-
-# FAST EMBEDDING MODEL
-
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+revisions = collection("revisions")
 
 CUSTOM_STOPWORDS = {
     "the","and","for","with","in","on","at","to","of","by","from","is","was",
@@ -25,17 +13,30 @@ CUSTOM_STOPWORDS = {
 
 STOPWORDS = ENGLISH_STOP_WORDS.union(CUSTOM_STOPWORDS)
 
-vectorizer_model = CountVectorizer(
-    stop_words="english",
-    min_df=2,
-    ngram_range=(1,2)
-)
+# BERTopic (and its UMAP / HDBSCAN stack) is only loaded by the first fit,
+# so importing the scraper stays cheap
+
+topic_model = None
+
+def load_topic_model():
+    global topic_model
+
+    if topic_model is None:
+        from bertopic import BERTopic
 
-topic_model = BERTopic(
-    vectorizer_model=vectorizer_model,
-    verbose=False,
-    calculate_probabilities=False
-)
+        vectorizer_model = CountVectorizer(
+            stop_words="english",
+            min_df=2,
+            ngram_range=(1,2)
+        )
+
+        topic_model = BERTopic(
+            vectorizer_model=vectorizer_model,
+            verbose=False,
+            calculate_probabilities=False
+        )
+
+    return topic_model
 
 def clean_topic_label(words):
 
@@ -53,35 +54,13 @@ def clean_topic_label(words):
     return ", ".join(clean[:3])
 
 
-def generate_topics():
-
-    docs = list(
-        analysis.find(
-            {
-                "final_risk": {"$gte": 0.35},
-                "clean_content": {"$exists": True, "$ne": ""}
-            },
-            {"clean_content": 1}
-        ).limit(1000)
-    )
-
-    if len(docs) < 10:
-        return None
-
-    texts = [
-        d.get("clean_content")
-        for d in docs
-        if d.get("clean_content")
-    ]
+def fit_topics(texts, embeddings=None):
 
-    if len(texts) < 10:
-        return None
+    # shares the scoring model (loaded on first use by core_engine)
+    if embeddings is None:
+        embeddings = encode_texts(texts, batch_size=32)
 
-    embeddings = embedding_model.encode(
-        texts,
-        batch_size=32,
-        show_progress_bar=False
-    )
+    topic_model = load_topic_model()
 
     topics, probs = topic_model.fit_transform(
         texts,
@@ -122,9 +101,45 @@ def generate_topics():
 
         })
 
-    topics_collection.delete_many({})
+    return topic_records
+
+
+@timed("generate_topics")
+def generate_topics():
+
+    # Reuse the revision embeddings stored while scoring instead of
+    # re-encoding; the text is still needed for topic keywords.
+    V, meta = load_vectors(
+        {"final_risk": {"$gte": 0.35}, "model": EMBEDDING_MODEL},
+        space="content",
+        limit=1000,
+        sort=[("_id", -1)],
+        meta=("page", "revid")
+    )
+
+    if len(meta) < 10:
+        return None
+
+    contents = {
+        (d["page"], d["revid"]): d.get("clean_content")
+        for d in revisions.find(
+            {"revid": {"$in": meta["revid"].tolist()}},
+            {"page": 1, "revid": 1, "clean_content": 1}
+        )
+    }
+
+    keep = [
+        i for i, key in enumerate(zip(meta["page"], meta["revid"]))
+        if contents.get(key)
+    ]
+
+    texts = [contents[(meta["page"][i], meta["revid"][i])] for i in keep]
+
+    if len(texts) < 10:
+        return None
+
+    topic_records = fit_topics(texts, V[keep])
 
-    if topic_records:
-        topics_collection.insert_many(topic_records)
+    replace_topics(topic_records)
 
     return topic_records
\ No newline at end of file
@@ -0,0 +1,325 @@
+import os, time, threading, logging
+import numpy as np
+from datetime import datetime, timedelta
+from pymongo import UpdateOne, ASCENDING
+from services.alerts.sinks import SINKS, enabled_sinks
+from services.scraper.leases import WORKER_ID
+from engine.db import collection, ensure_ttl_index
+
+logger = logging.getLogger(__name__)
+
+outbox = collection("alert_outbox")
+
+# ---------------- CONFIG ---------------- #
+
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "50"))
+
+# Token bucket shared by all sinks of this process
+ALERT_RATE_PER_MINUTE = float(os.getenv("ALERT_RATE_PER_MINUTE", "120"))
+ALERT_BURST = int(os.getenv("ALERT_BURST", "50"))
+
+ALERT_MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", "8"))
+ALERT_RETRY_BASE_SECONDS = float(os.getenv("ALERT_RETRY_BASE_SECONDS", "2"))
+ALERT_RETRY_MAX_SECONDS = 300
+
+# Claimed alerts return to the queue if a dispatcher dies mid-delivery
+ALERT_LEASE_SECONDS = 120
+
+# Idle wait between outbox polls; new alerts wake the dispatcher at once
+ALERT_POLL_SECONDS = float(os.getenv("ALERT_POLL_SECONDS", "5"))
+
+# How long the end of a monitoring run waits for queued alerts to go out
+ALERT_DRAIN_SECONDS = float(os.getenv("ALERT_DRAIN_SECONDS", "30"))
+
+# Delivered and dead alerts are dropped by a TTL index after this long
+ALERT_RETENTION_DAYS = int(os.getenv("ALERT_RETENTION_DAYS", "7"))
+
+ALERT_FIELDS = [
+    "page", "revid", "username", "final_risk",
+    "content_risk", "username_risk", "semantic_similarity"
+]
+
+# ---------------- OUTBOX ---------------- #
+
+_indexes_ready = False
+
+def ensure_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    outbox.create_index([("status", ASCENDING), ("next_attempt", ASCENDING)])
+    ensure_ttl_index(outbox, "finished_at", ALERT_RETENTION_DAYS * 86400)
+    _indexes_ready = True
+
+def alert_id(page, revid):
+    return f"{page}:{revid}"
+
+def enqueue_alert(analysis_doc):
+    # Durable and idempotent: re-analysing the same revision does not
+    # create a second alert. Delivery happens on the dispatcher thread.
+    ensure_indexes()
+
+    now = datetime.utcnow()
+
+    result = outbox.update_one(
+        {"_id": alert_id(analysis_doc["page"], analysis_doc["revid"])},
+        {"$setOnInsert": {
+            **{f: analysis_doc.get(f) for f in ALERT_FIELDS},
+            "detected_at": analysis_doc.get("created_at", now),
+            "enqueued_at": now,
+            "status": "pending",
+            "sinks_pending": enabled_sinks(),
+            "attempts": 0,
+            "next_attempt": now
+        }},
+        upsert=True
+    )
+
+    if result.upserted_id is None:
+        return False
+
+    _wake.set()
+    return True
+
+def claim_batch(limit, worker_id=WORKER_ID):
+    now = datetime.utcnow()
+    claimed = []
+
+    for _ in range(limit):
+        doc = outbox.find_one_and_update(
+            {
+                "status": "pending",
+                "next_attempt": {"$lte": now},
+                "$or": [{"lease_expires": None}, {"lease_expires": {"$lt": now}}]
+            },
+            {"$set": {
+                "lease_owner": worker_id,
+                "lease_expires": now + timedelta(seconds=ALERT_LEASE_SECONDS)
+            }},
+            sort=[("next_attempt", ASCENDING)]
+        )
+        if doc is None:
+            break
+        claimed.append(doc)
+
+    return claimed
+
+def pending_count():
+    return outbox.count_documents({"status": "pending"})
+
+# ---------------- RATE LIMIT ---------------- #
+
+class TokenBucket:
+
+    def __init__(self, rate_per_minute=ALERT_RATE_PER_MINUTE, burst=ALERT_BURST):
+        self.rate = rate_per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def available(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return int(self.tokens)
+
+    def take(self, n):
+        self.tokens -= n
+
+# ---------------- DELIVERY ---------------- #
+
+_stats_lock = threading.Lock()
+_stats = {"delivered": 0, "retried": 0, "dead": 0, "latencies": []}
+
+def payload(doc):
+    alert = {f: doc.get(f) for f in ALERT_FIELDS}
+    alert["id"] = doc["_id"]
+    alert["detected_at"] = doc["detected_at"].isoformat() + "Z"
+    return alert
+
+def backoff_seconds(attempts):
+    return min(ALERT_RETRY_BASE_SECONDS * 2 ** (attempts - 1), ALERT_RETRY_MAX_SECONDS)
+
+def deliver(batch):
+    # Each sink receives one call per batch; an alert is done once every
+    # sink it was queued for has accepted it, so a failing webhook does not
+    # cause repeats on the sinks that already succeeded.
+    failed = {}
+
+    for name in sorted({s for doc in batch for s in doc["sinks_pending"]}):
+        docs = [d for d in batch if name in d["sinks_pending"]]
+        try:
+            SINKS[name]([payload(d) for d in docs])
+        except Exception as e:
+            logger.warning("Alert sink %s failed for %s alerts: %s", name, len(docs), e)
+            failed[name] = str(e)
+
+    now = datetime.utcnow()
+    ops = []
+    latencies = []
+    retried = dead = 0
+
+    for doc in batch:
+        remaining = [s for s in doc["sinks_pending"] if s in failed]
+        release = {"lease_owner": "", "lease_expires": ""}
+
+        if not remaining:
+            latency = (now - doc["detected_at"]).total_seconds()
+            latencies.append(latency)
+            ops.append(UpdateOne({"_id": doc["_id"]}, {
+                "$set": {
+                    "status": "delivered",
+                    "sinks_pending": [],
+                    "delivered_at": now,
+                    "finished_at": now,
+                    "latency_ms": round(latency * 1000, 1)
+                },
+                "$inc": {"attempts": 1},
+                "$unset": release
+            }))
+            continue
+
+        attempts = doc["attempts"] + 1
+        update = {
+            "sinks_pending": remaining,
+            "last_error": "; ".join(f"{s}: {failed[s]}" for s in remaining)
+        }
+
+        if attempts >= ALERT_MAX_ATTEMPTS:
+            update["status"] = "dead"
+            update["finished_at"] = now
+            dead += 1
+        else:
+            update["next_attempt"] = now + timedelta(seconds=backoff_seconds(attempts))
+            retried += 1
+
+        ops.append(UpdateOne({"_id": doc["_id"]}, {
+            "$set": update, "$inc": {"attempts": 1}, "$unset": release
+        }))
+
+    if ops:
+        outbox.bulk_write(ops, ordered=False)
+
+    with _stats_lock:
+        _stats["delivered"] += len(latencies)
+        _stats["retried"] += retried
+        _stats["dead"] += dead
+        _stats["latencies"].extend(latencies)
+
+    return len(latencies)
+
+# ---------------- DISPATCHER ---------------- #
+
+_wake = threading.Event()
+_stop = threading.Event()
+_thread = None
+
+def dispatch_once(bucket):
+    limit = min(ALERT_BATCH_SIZE, bucket.available())
+
+    if limit <= 0:
+        return 0
+
+    batch = claim_batch(limit)
+
+    if not batch:
+        return 0
+
+    bucket.take(len(batch))
+    deliver(batch)
+
+    return len(batch)
+
+def dispatch_loop():
+    bucket = TokenBucket()
+
+    while not _stop.is_set():
+        _wake.clear()
+
+        try:
+            sent = dispatch_once(bucket)
+        except Exception as e:
+            # keep the thread alive through transient Mongo errors
+            logger.error("Alert dispatch failed: %s", e)
+            sent = 0
+
+        if sent == 0:
+            _wake.wait(ALERT_POLL_SECONDS if bucket.available() > 0 else 1)
+
+def start_dispatcher():
+    global _thread
+
+    if _thread is not None and _thread.is_alive():
+        return _thread
+
+    ensure_indexes()
+    enabled_sinks()
+
+    _stop.clear()
+    _thread = threading.Thread(target=dispatch_loop, name="alert-dispatcher", daemon=True)
+    _thread.start()
+
+    return _thread
+
+def stop_dispatcher(drain_seconds=ALERT_DRAIN_SECONDS):
+    # Gives queued alerts a bounded chance to go out; anything left stays
+    # in the outbox for the next run or a standalone dispatcher.
+    global _thread
+
+    deadline = time.time() + drain_seconds
+
+    while _thread is not None and time.time() < deadline:
+        if pending_count() == 0:
+            break
+        _wake.set()
+        time.sleep(0.2)
+
+    _stop.set()
+    _wake.set()
+
+    if _thread is not None:
+        _thread.join(timeout=10)
+        _thread = None
+
+    return alert_summary()
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update({"delivered": 0, "retried": 0, "dead": 0, "latencies": []})
+
+def alert_summary():
+    with _stats_lock:
+        latencies = np.array(_stats["latencies"]) * 1000
+        summary = {k: _stats[k] for k in ["delivered", "retried", "dead"]}
+
+    summary["pending"] = pending_count()
+
+    if len(latencies):
+        p50, p95 = np.percentile(latencies, [50, 95])
+        summary.update({
+            "latency_p50_ms": round(float(p50), 1),
+            "latency_p95_ms": round(float(p95), 1),
+            "latency_max_ms": round(float(latencies.max()), 1)
+        })
+
+    return summary
+
+# ---------------- STANDALONE ---------------- #
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s"
+    )
+
+    logger.info("Dispatching alerts to %s", ", ".join(enabled_sinks()))
+
+    start_dispatcher()
+
+    try:
+        while True:
+            time.sleep(60)
+            logger.info("Alerts: %s", alert_summary())
+    except KeyboardInterrupt:
+        logger.info("Alerts: %s", stop_dispatcher(0))
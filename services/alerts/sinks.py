@@ -0,0 +1,62 @@
+import os, json, sys, threading
+import requests
+
+# ---------------- CONFIG ---------------- #
+
+# Comma-separated sink names, e.g. "stdout,webhook"
+ALERT_SINKS = [s.strip() for s in os.getenv("ALERT_SINKS", "stdout").split(",") if s.strip()]
+
+ALERT_FILE = os.getenv("ALERT_FILE", "alerts.jsonl")
+
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+ALERT_WEBHOOK_TIMEOUT = float(os.getenv("ALERT_WEBHOOK_TIMEOUT", "10"))
+
+# ---------------- SINKS ---------------- #
+
+# A sink takes a list of alert dicts and raises if the batch was not
+# delivered; the dispatcher retries the whole batch for that sink.
+
+_file_lock = threading.Lock()
+
+def alert_line(alert):
+    return (
+        f"[ALERT] {alert['page']} rev {alert['revid']} by {alert['username']} "
+        f"risk={alert['final_risk']:.3f}"
+    )
+
+def stdout_sink(alerts):
+    for alert in alerts:
+        print(alert_line(alert), file=sys.stdout, flush=True)
+
+def file_sink(alerts):
+    lines = [json.dumps(a, default=str) for a in alerts]
+    with _file_lock:
+        with open(ALERT_FILE, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+def webhook_sink(alerts):
+    if not ALERT_WEBHOOK_URL:
+        raise RuntimeError("ALERT_WEBHOOK_URL not set")
+
+    response = requests.post(
+        ALERT_WEBHOOK_URL,
+        data=json.dumps({"alerts": alerts}, default=str),
+        headers={"Content-Type": "application/json"},
+        timeout=ALERT_WEBHOOK_TIMEOUT
+    )
+    response.raise_for_status()
+
+SINKS = {
+    "stdout": stdout_sink,
+    "file": file_sink,
+    "webhook": webhook_sink
+}
+
+def register_sink(name, func):
+    SINKS[name] = func
+
+def enabled_sinks():
+    unknown = [name for name in ALERT_SINKS if name not in SINKS]
+    if unknown:
+        raise RuntimeError(f"Unknown alert sinks: {unknown}")
+    return list(ALERT_SINKS)
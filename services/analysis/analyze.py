@@ -1,74 +1,117 @@
-import os, pandas as pd
-from pymongo import MongoClient
+import sys, json, pandas as pd
+from pathlib import Path
 import plotly.express as px
+import pyarrow.dataset as pads
 
-# Connecting to MONGO DB:
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
-MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
-db = client["infoguard"]
+from services.analysis.parquet_export import EXPORT_DIR, read_dataset, read_topics
 
-# Load data:
-runs = db["runs"]
-topics = db["topics"]
+# Reads the Parquet export (python -m services.analysis.parquet_export),
+# never the production database.
 
-df = pd.DataFrame(list(runs.find()))
-df_topic = pd.DataFrame(list(topics.find()))
+# Recent runs carrying the per-stage timing breakdown
+STAGE_RUNS = 20
 
-if df.empty and df_topic.empty:
-    print("No run data found")
+# Only the columns used below are read, and runs cut short by the time
+# budget or a crash are filtered out in the scan
+df_runs = read_dataset(
+    "runs",
+    columns=["timestamp", "duration_seconds", "pages_per_minute", "stages_json"],
+    where=pads.field("status") == "completed"
+)
+
+df_topic = read_topics()
+
+if df_runs.empty and df_topic.empty:
+    print("No exported run data found in", EXPORT_DIR)
     exit()
 
-# Cleaning data:
-df.drop(columns=["_id"], inplace = True)
-df_topic.drop(columns=["_id"], inplace = True)
+df_runs["date"] = pd.to_datetime(df_runs["timestamp"]).dt.floor("D")
 
-df["pages_per_minute"] = df["pages_checked"] / (df["duration_seconds"] / 60)
-df["timestamp"] = pd.to_datetime(df["timestamp"])
+# One row per day:
+df = df_runs.groupby("date").agg(
+    runs=("duration_seconds", "size"),
+    avg_duration_minutes=("duration_seconds", lambda s: s.mean() / 60),
+    min_duration_minutes=("duration_seconds", lambda s: s.min() / 60),
+    max_duration_minutes=("duration_seconds", lambda s: s.max() / 60),
+    avg_pages_per_minute=("pages_per_minute", "mean"),
+    min_pages_per_minute=("pages_per_minute", "min"),
+    max_pages_per_minute=("pages_per_minute", "max")
+).reset_index()
 
-# Converting seconds -> minutes:
-df["duration_minutes"] = df["duration_seconds"] / 60
+total_runs = len(df_runs)
 
 # Print stats
 print("\n=== Runtime Statistics ===\n")
 
-print("Total Runs:", len(df))
-print("Average runtime:", round(df["duration_minutes"].mean(), 2), "minutes")
-print("Minimum runtime:", round(df["duration_minutes"].min(), 2), "minutes")
-print("Maximum runtime:", round(df["duration_minutes"].max(), 2), "minutes")
+print("Total Runs:", total_runs)
+print("Average runtime:", round(df_runs["duration_seconds"].mean() / 60, 2), "minutes")
+print("Minimum runtime:", round(df_runs["duration_seconds"].min() / 60, 2), "minutes")
+print("Maximum runtime:", round(df_runs["duration_seconds"].max() / 60, 2), "minutes")
 
 print("\n=== Throughput Statistics ===\n")
 
-print("Average pages/minute:", round(df["pages_per_minute"].mean(), 2))
-print("Minimum pages/minute:", round(df["pages_per_minute"].min(), 2))
-print("Maximum pages/minute:", round(df["pages_per_minute"].max(), 2))
+print("Average pages/minute:", round(df_runs["pages_per_minute"].mean(), 2))
+print("Minimum pages/minute:", round(df_runs["pages_per_minute"].min(), 2))
+print("Maximum pages/minute:", round(df_runs["pages_per_minute"].max(), 2))
+
+print("\n=== Stage Breakdown (last %s runs) ===\n" % STAGE_RUNS)
+
+stage_runs = (
+    df_runs.dropna(subset=["stages_json"])
+    .sort_values("timestamp", ascending=False)
+    .head(STAGE_RUNS)
+)
+
+df_stages = pd.DataFrame([
+    {"stage": stage, **stats}
+    for raw in stage_runs["stages_json"]
+    for stage, stats in json.loads(raw).items()
+])
+
+if df_stages.empty:
+    print("No stage timings recorded yet")
+else:
+    breakdown = df_stages.groupby("stage").agg(
+        calls=("count", "sum"),
+        total_seconds=("total_seconds", "sum"),
+        p50_ms=("p50_ms", "median"),
+        p95_ms=("p95_ms", "median"),
+        p99_ms=("p99_ms", "median")
+    )
+    breakdown["share_pct"] = (
+        breakdown["total_seconds"] / breakdown["total_seconds"].sum() * 100
+    ).round(1)
+    print(breakdown.sort_values("total_seconds", ascending=False).round(2))
 
 print("\n=== Topic Quality Statistics ===\n")
 
-print("Total topics discovered:", len(df_topic))
-print("Average edits per topic:", round(df_topic["Count"].mean(), 2))
-print("Largest topic size:", df_topic["Count"].max())
-print("Smallest topic size:", df_topic["Count"].min())
+if df_topic.empty:
+    print("No topics in the export snapshot")
+else:
+    print("Total topics discovered:", len(df_topic))
+    print("Average edits per topic:", round(df_topic["Count"].mean(), 2))
+    print("Largest topic size:", df_topic["Count"].max())
+    print("Smallest topic size:", df_topic["Count"].min())
 
-print("\nTop 10 topics:")
-print(df_topic.sort_values("Count", ascending=False).head(10)[["Name","Count"]])
+    print("\nTop 10 topics:")
+    print(df_topic.sort_values("Count", ascending=False).head(10)[["Name","Count"]])
 
-print("\n=== Topic Stability Analysis ===\n")
+    print("\n=== Topic Stability Analysis ===\n")
 
-large_topics = df_topic[df_topic["Count"] >= 15]
+    large_topics = df_topic[df_topic["Count"] >= 15]
 
-print("Stable topics (Count >= 15):")
-print(large_topics[["Name","Count"]])
+    print("Stable topics (Count >= 15):")
+    print(large_topics[["Name","Count"]])
 
-print("\nPercentage of stable topics:",
-      round(len(large_topics)/len(df)*100, 2), "%")
+    print("\nPercentage of stable topics:",
+          round(len(large_topics)/len(df_topic)*100, 2), "%")
 
-# Save CSV for record
+# Save CSV for record (runtime and throughput per day)
 df.to_csv("runtime_analysis.csv", index=False)
-df.to_csv("throughput_analysis.csv", index=False)
 
 print("\nSaved runtime_analysis.csv")
-print("\nSaved throughput_analysis.csv")
 
 # # Plot runtime trend
 # fig = px.line(
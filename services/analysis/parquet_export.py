@@ -0,0 +1,269 @@
+import os, sys, json, uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from engine.db import collection
+
+# ---------------- CONFIG ---------------- #
+
+EXPORT_DIR = Path(os.getenv("INFOGUARD_EXPORT_DIR", "exports"))
+
+WATERMARK_FILE = "_watermarks.json"
+
+# Documents newer than this are left for the next export, so writes still
+# in flight from concurrent workers are not skipped past
+EXPORT_LAG_SECONDS = int(os.getenv("INFOGUARD_EXPORT_LAG_SECONDS", "120"))
+
+BATCH_SIZE = 20_000
+
+# Each dataset is appended to <EXPORT_DIR>/<name>/dt=YYYY-MM-DD/*.parquet.
+# `watermark` is the field new documents are found by; `time` drives the
+# date partition. Columns are flattened to scalars with a fixed schema so
+# every file of a dataset unifies.
+DATASETS = {
+    "analysis": {
+        "collection": "analysis",
+        "watermark": "_id",
+        "time": "created_at",
+        "schema": pa.schema([
+            ("id", pa.string()),
+            ("page", pa.string()),
+            ("revid", pa.int64()),
+            ("username", pa.string()),
+            ("final_risk", pa.float64()),
+            ("semantic_similarity", pa.float64()),
+            ("content_score", pa.float64()),
+            ("username_score", pa.float64()),
+            ("editor_risk", pa.float64()),
+            ("flagged", pa.bool_()),
+            ("created_at", pa.timestamp("ms"))
+        ]),
+        "fields": {
+            "content_score": lambda d: (d.get("content_risk") or {}).get("risk_score"),
+            "username_score": lambda d: (d.get("username_risk") or {}).get("risk_score")
+        }
+    },
+    "runs": {
+        "collection": "runs",
+        # run _ids are allocated when a run starts, so use the write time
+        "watermark": "recorded_at",
+        "time": "timestamp",
+        "schema": pa.schema([
+            ("id", pa.string()),
+            ("timestamp", pa.timestamp("ms")),
+            ("worker_id", pa.string()),
+            ("status", pa.string()),
+            ("pages_checked", pa.int64()),
+            ("changes_detected", pa.int64()),
+            ("flagged", pa.int64()),
+            ("duration_seconds", pa.float64()),
+            ("pages_per_minute", pa.float64()),
+            ("peak_rss_mb", pa.float64()),
+            ("alerts_delivered", pa.int64()),
+            ("stages_json", pa.string())
+        ]),
+        "fields": {
+            "status": lambda d: d.get("status", "completed"),
+            # older runs only carry the inputs
+            "pages_per_minute": lambda d: d.get("pages_per_minute") or (
+                d["pages_checked"] / (d["duration_seconds"] / 60)
+                if d.get("duration_seconds") else None
+            ),
+            "alerts_delivered": lambda d: (d.get("alerts") or {}).get("delivered"),
+            "stages_json": lambda d: json.dumps(d["stages"]) if d.get("stages") else None
+        }
+    },
+    "anomalies": {
+        "collection": "anomalies",
+        # spikes are re-upserted (stream, batch, backfill) with a new
+        # detected_at; the re-detected spike is appended again, and the
+        # row with the latest detected_at per id is current
+        "watermark": "detected_at",
+        "time": "timestamp",
+        "schema": pa.schema([
+            ("id", pa.string()),
+            ("timestamp", pa.timestamp("ms")),
+            ("source", pa.string()),
+            ("metric", pa.string()),
+            ("scope", pa.string()),
+            ("granularity", pa.string()),
+            ("page", pa.string()),
+            ("final_risk", pa.float64()),
+            ("value", pa.float64()),
+            ("z", pa.float64()),
+            ("risk_z", pa.float64()),
+            ("detected_at", pa.timestamp("ms"))
+        ]),
+        "fields": {}
+    }
+}
+
+TOPICS_SCHEMA = pa.schema([
+    ("Topic", pa.int64()),
+    ("Name", pa.string()),
+    ("Count", pa.int64())
+])
+
+# ---------------- WATERMARKS ---------------- #
+
+def load_watermarks(root=EXPORT_DIR):
+    path = root / WATERMARK_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+def save_watermarks(marks, root=EXPORT_DIR):
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = root / (WATERMARK_FILE + ".tmp")
+    tmp.write_text(json.dumps(marks, indent=2))
+    tmp.replace(root / WATERMARK_FILE)
+
+def encode_mark(value):
+    if isinstance(value, ObjectId):
+        return {"oid": str(value)}
+    return {"date": value.isoformat()}
+
+def decode_mark(mark):
+    if mark is None:
+        return None
+    if "oid" in mark:
+        return ObjectId(mark["oid"])
+    return datetime.fromisoformat(mark["date"])
+
+def export_query(spec, mark, upper):
+    field = spec["watermark"]
+
+    if field == "_id":
+        upper = ObjectId.from_datetime(upper)
+
+    bounds = {"$lte": upper}
+
+    if mark is not None:
+        bounds["$gt"] = mark
+        return {field: bounds}
+
+    # first export: also take documents written before the field existed
+    return {"$or": [{field: bounds}, {field: {"$exists": False}}]}
+
+# ---------------- EXPORT ---------------- #
+
+def to_table(docs, spec):
+    fields = spec["fields"]
+    rows = []
+
+    for d in docs:
+        row = {"id": str(d["_id"])}
+        for name in spec["schema"].names[1:]:
+            row[name] = fields[name](d) if name in fields else d.get(name)
+        rows.append(row)
+
+    df = pd.DataFrame(rows, columns=spec["schema"].names)
+    df["dt"] = pd.to_datetime(df[spec["time"]]).dt.strftime("%Y-%m-%d").fillna("unknown")
+
+    schema = spec["schema"].append(pa.field("dt", pa.string()))
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+def write_batch(table, name, root):
+    ds.write_dataset(
+        table,
+        root / name,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("dt", pa.string())]), flavor="hive"),
+        basename_template=f"part-{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore"
+    )
+
+def export_dataset(name, marks, root=EXPORT_DIR, upper=None):
+    spec = DATASETS[name]
+    field = spec["watermark"]
+    upper = upper or datetime.utcnow() - timedelta(seconds=EXPORT_LAG_SECONDS)
+
+    mark = decode_mark(marks.get(name))
+
+    if isinstance(mark, ObjectId) and field != "_id":
+        # dataset used to follow _id (anomalies did)
+        mark = mark.generation_time.replace(tzinfo=None)
+
+    cursor = collection(spec["collection"]).find(
+        export_query(spec, mark, upper)
+    ).sort(field, 1).batch_size(BATCH_SIZE)
+
+    exported = 0
+    batch = []
+
+    def flush():
+        nonlocal exported
+        write_batch(to_table(batch, spec), name, root)
+        exported += len(batch)
+        # advance only past what is safely on disk
+        last = batch[-1].get(field)
+        if last is not None:
+            marks[name] = encode_mark(last)
+            save_watermarks(marks, root)
+        batch.clear()
+
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            flush()
+
+    if batch:
+        flush()
+
+    if name not in marks:
+        # nothing stamped yet; later runs only need documents after `upper`
+        marks[name] = encode_mark(ObjectId.from_datetime(upper) if field == "_id" else upper)
+        save_watermarks(marks, root)
+
+    return exported
+
+def export_topics(root=EXPORT_DIR):
+    # Topics are replaced wholesale on every run, so keep a snapshot
+    docs = list(collection("topics").find({}, {"_id": 0, "Topic": 1, "Name": 1, "Count": 1}))
+    root.mkdir(parents=True, exist_ok=True)
+    # explicit schema, so an empty snapshot still has its columns
+    table = pa.Table.from_pylist(docs, schema=TOPICS_SCHEMA)
+    pq.write_table(table, root / "topics.parquet")
+    return table.num_rows
+
+def export_all(root=EXPORT_DIR):
+    marks = load_watermarks(root)
+    counts = {name: export_dataset(name, marks, root) for name in DATASETS}
+    counts["topics"] = export_topics(root)
+    return counts
+
+# ---------------- READ ---------------- #
+
+def read_dataset(name, columns=None, since=None, where=None, root=EXPORT_DIR):
+    # Column pruning and predicate pushdown: only the requested columns of
+    # the date partitions at or after `since` are read from disk.
+    path = root / name
+
+    if not path.exists():
+        return pd.DataFrame(columns=columns)
+
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    expr = where
+
+    if since is not None:
+        time_field = DATASETS[name]["time"]
+        window = (ds.field("dt") >= f"{since:%Y-%m-%d}") & (ds.field(time_field) >= pd.Timestamp(since))
+        expr = window if expr is None else expr & window
+
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+def read_topics(root=EXPORT_DIR):
+    path = root / "topics.parquet"
+    return pd.read_parquet(path) if path.exists() else pd.DataFrame(columns=["Topic", "Name", "Count"])
+
+if __name__ == "__main__":
+    counts = export_all()
+    for name, n in counts.items():
+        print(f"{name:<10} {n} documents exported")
+    print("Export directory:", EXPORT_DIR.resolve())
@@ -0,0 +1,114 @@
+import os, signal
+from datetime import datetime, timedelta
+from bson import ObjectId
+from engine.db import ensure_ttl_index
+
+# ---------------- CONFIG ---------------- #
+
+# Wall-clock budget for one monitoring run (page checks + post-run steps)
+RUN_BUDGET_SECONDS = int(os.getenv("INFOGUARD_RUN_BUDGET_SECONDS", str(50 * 60)))
+
+# Time kept back at the end of the budget for topics / ML scoring and the
+# final write; page checks stop once only this much is left
+POST_RUN_RESERVE_SECONDS = int(os.getenv("INFOGUARD_POST_RUN_RESERVE_SECONDS", "300"))
+
+CHECKPOINT_SECONDS = int(os.getenv("INFOGUARD_CHECKPOINT_SECONDS", "30"))
+
+# A checkpoint without a heartbeat for this long belongs to a dead run
+INTERRUPTED_AFTER_SECONDS = int(os.getenv("INFOGUARD_INTERRUPTED_AFTER_SECONDS", "600"))
+
+# Checkpoints no run recovered (no worker started for this long) are
+# dropped by a TTL index on the heartbeat
+CHECKPOINT_TTL_DAYS = int(os.getenv("INFOGUARD_CHECKPOINT_TTL_DAYS", "7"))
+
+COUNTERS = ["pages_checked", "changes_detected", "flagged"]
+
+# ---------------- BUDGET ---------------- #
+
+_stop_signal = {"name": None}
+
+def handle_stop_signals():
+    # docker stop / CI cancellation send SIGTERM: finish the current page,
+    # then wind down as if the budget had run out
+    def handler(signum, frame):
+        _stop_signal["name"] = signal.Signals(signum).name
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, handler)
+
+def stop_requested():
+    return _stop_signal["name"]
+
+def page_budget_left(deadline, now):
+    return deadline - POST_RUN_RESERVE_SECONDS - now
+
+# ---------------- CHECKPOINTS ---------------- #
+
+def ensure_checkpoint_indexes(checkpoints):
+    ensure_ttl_index(checkpoints, "heartbeat", CHECKPOINT_TTL_DAYS * 86400)
+
+def start_checkpoint(checkpoints, worker_id, budget_seconds=RUN_BUDGET_SECONDS):
+    now = datetime.utcnow()
+
+    doc = {
+        "_id": ObjectId(),
+        "worker_id": worker_id,
+        "started_at": now,
+        "heartbeat": now,
+        "budget_seconds": budget_seconds,
+        "last_page": None,
+        **{c: 0 for c in COUNTERS}
+    }
+
+    checkpoints.insert_one(doc)
+
+    return doc["_id"]
+
+def save_checkpoint(checkpoints, run_id, counters, last_page=None, stages=None):
+    update = {
+        "heartbeat": datetime.utcnow(),
+        "last_page": last_page,
+        **{c: counters[c] for c in COUNTERS}
+    }
+
+    if stages is not None:
+        update["stages"] = stages
+
+    checkpoints.update_one({"_id": run_id}, {"$set": update})
+
+def finish_checkpoint(checkpoints, run_id):
+    checkpoints.delete_one({"_id": run_id})
+
+def recover_interrupted(checkpoints, runs):
+    # Turns checkpoints of runs that died (timeout, OOM, lost container)
+    # into runs documents carrying their partial counters. Each checkpoint
+    # is removed atomically first, so concurrent workers recover it once.
+    cutoff = datetime.utcnow() - timedelta(seconds=INTERRUPTED_AFTER_SECONDS)
+
+    recovered = []
+
+    while True:
+        doc = checkpoints.find_one_and_delete({"heartbeat": {"$lt": cutoff}})
+
+        if doc is None:
+            break
+
+        run_doc = {
+            "_id": doc["_id"],
+            "timestamp": doc["heartbeat"],
+            "worker_id": doc.get("worker_id"),
+            "recorded_at": datetime.utcnow(),
+            "status": "interrupted",
+            "started_at": doc["started_at"],
+            "last_page": doc.get("last_page"),
+            **{c: doc.get(c, 0) for c in COUNTERS},
+            "duration_seconds": round((doc["heartbeat"] - doc["started_at"]).total_seconds(), 2)
+        }
+
+        if doc.get("stages"):
+            run_doc["stages"] = doc["stages"]
+
+        runs.insert_one(run_doc)
+        recovered.append(run_doc)
+
+    return recovered
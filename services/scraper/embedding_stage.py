@@ -0,0 +1,96 @@
+import os, queue, threading, logging
+from concurrent.futures import Future
+from engine.core_engine import encode_texts
+from engine.instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# ---------------- CONFIG ---------------- #
+
+# Most edits (two texts each) encoded in one model call
+EMBED_BATCH_EDITS = int(os.getenv("INFOGUARD_EMBED_BATCH", "32"))
+
+# ---------------- STAGE ---------------- #
+
+class EmbeddingStage:
+    # One thread owns the model and serves every fetch worker of every
+    # wiki. A batch is whatever queued up while the previous one was being
+    # encoded, so a lone worker never waits for a batch to fill.
+
+    def __init__(self, batch_edits=EMBED_BATCH_EDITS):
+        self.batch_edits = batch_edits
+        self.queue = queue.Queue()
+        self.thread = None
+        self.stats = {"batches": 0, "edits": 0, "max_batch": 0}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="embedding-stage", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def encode(self, old_text, new_text):
+        # Drop-in for core_engine.encode_edit; blocks the calling worker
+        # until its batch is done
+        future = Future()
+        self.queue.put(((old_text, new_text), future))
+        return future.result()
+
+    def next_batch(self):
+        item = self.queue.get()
+
+        if item is None:
+            return None
+
+        batch = [item]
+
+        while len(batch) < self.batch_edits:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                # finish this batch, then stop
+                self.queue.put(None)
+                break
+
+            batch.append(item)
+
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+
+            if batch is None:
+                return
+
+            texts = [t for pair, _ in batch for t in pair]
+
+            try:
+                with span("embed_batch"):
+                    encoded = encode_texts(texts)
+            except Exception as e:
+                logger.exception("Embedding batch of %s edits failed", len(batch))
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for i, (_, future) in enumerate(batch):
+                future.set_result(encoded[2 * i:2 * i + 2])
+
+            self.stats["batches"] += 1
+            self.stats["edits"] += len(batch)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+
+    def summary(self):
+        return {
+            **self.stats,
+            "mean_batch": round(self.stats["edits"] / self.stats["batches"], 2) if self.stats["batches"] else 0
+        }
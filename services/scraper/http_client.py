@@ -1,7 +1,63 @@
-import requests
+import requests, os, json, threading
 from time import sleep
+from engine.instrumentation import timed
 
+# ---------------- RECORD / REPLAY ---------------- #
+
+# INFOGUARD_HTTP_MODE=record appends every successful response to the
+# cassette file; INFOGUARD_HTTP_MODE=replay serves responses from it and
+# never touches the network.
+
+HTTP_MODE = os.getenv("INFOGUARD_HTTP_MODE", "live")
+HTTP_CASSETTE = os.getenv("INFOGUARD_HTTP_CASSETTE", "http_cassette.jsonl")
+
+_cassette_lock = threading.Lock()
+_cassette = None
+
+def request_key(url, params):
+    return url + "?" + json.dumps(params or {}, sort_keys=True, default=str)
+
+def load_cassette(path=HTTP_CASSETTE):
+    # key -> list of recorded responses, replayed round-robin
+    entries = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries.setdefault(entry["key"], []).append(entry["response"])
+    return {key: {"responses": responses, "next": 0} for key, responses in entries.items()}
+
+def replay_response(url, params):
+    global _cassette
+
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = load_cassette()
+
+        slot = _cassette.get(request_key(url, params))
+
+        if slot is None:
+            print(f"No recorded response for {url} {params}")
+            return None
+
+        response = slot["responses"][slot["next"] % len(slot["responses"])]
+        slot["next"] += 1
+
+    return response
+
+def record_response(url, params, response):
+    line = json.dumps({"key": request_key(url, params), "response": response})
+    with _cassette_lock:
+        with open(HTTP_CASSETTE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+# ---------------- CLIENT ---------------- #
+
+@timed("safe_get")
 def safe_get(url, params, headers, retries=5, timeout=20):
+    if HTTP_MODE == "replay":
+        return replay_response(url, params)
+
     for attempt in range(retries):
         try:
             response = requests.get(
@@ -11,15 +67,20 @@ def safe_get(url, params, headers, retries=5, timeout=20):
                 timeout=timeout
             )
             response.raise_for_status()
-            return response.json()
+            data = response.json()
+
+            if HTTP_MODE == "record":
+                record_response(url, params, data)
+
+            return data
 
         except requests.exceptions.ReadTimeout:
             print(f"Timeout (attempt {attempt+1}/{retries}) — retrying...")
-        
+
         except requests.exceptions.RequestException as e:
             print(f"Request error: {e} — retrying...")
 
         sleep(2 ** attempt)   # exponential backoff
 
     print("API failed after retries — skipping request")
-    return None
\ No newline at end of file
+    return None
@@ -0,0 +1,132 @@
+import os, socket, uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+# ---------------- CONFIG ---------------- #
+
+# INFOGUARD_WORKER_ID names the host/container; the pid keeps the
+# processes of one `--workers N` launch (which all inherit it) apart
+WORKER_ID = (
+    f"{os.environ['INFOGUARD_WORKER_ID']}-{os.getpid()}"
+    if os.getenv("INFOGUARD_WORKER_ID")
+    else f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+)
+
+# A claimed page is reclaimable by other workers once this expires
+LEASE_SECONDS = int(os.getenv("INFOGUARD_LEASE_SECONDS", "600"))
+
+LEASE_BATCH_SIZE = int(os.getenv("INFOGUARD_LEASE_BATCH", "25"))
+
+# A page that was claimed and released is not due again before this
+RECHECK_MINUTES = int(os.getenv("INFOGUARD_RECHECK_MINUTES", "30"))
+
+# Pages left unfinished by an earlier run are claimed first
+CLAIM_ORDER = [
+    ("resume_pending", DESCENDING),
+    ("priority_score", DESCENDING),
+    ("last_checked", ASCENDING)
+]
+
+# ---------------- PAGE LEASES ---------------- #
+
+def ensure_lease_indexes(pages):
+    pages.create_index([("watch_status", ASCENDING)] + CLAIM_ORDER)
+    pages.create_index([("watch_status", ASCENDING), ("wiki", ASCENDING)] + CLAIM_ORDER)
+    pages.create_index([("lease_owner", ASCENDING)])
+
+def due_query(now):
+    cutoff = now - timedelta(minutes=RECHECK_MINUTES)
+
+    return {
+        "watch_status": "active",
+        "$or": [
+            # free and not claimed recently
+            {
+                "lease_owner": None,
+                "$or": [
+                    {"last_claimed": None},
+                    {"last_claimed": {"$lt": cutoff}}
+                ]
+            },
+            # claimed by a run that stopped before checking it
+            {
+                "lease_owner": None,
+                "resume_pending": True
+            },
+            # held by a worker that died without releasing it
+            {
+                "lease_owner": {"$ne": None},
+                "lease_expires": {"$lt": now}
+            }
+        ]
+    }
+
+def claim_page(pages, worker_id=WORKER_ID, where=None):
+    # `where` narrows the claim (e.g. to one wiki's pages)
+    now = datetime.utcnow()
+
+    doc = pages.find_one_and_update(
+        {**due_query(now), **(where or {})},
+        {"$set": {
+            "lease_owner": worker_id,
+            "lease_expires": now + timedelta(seconds=LEASE_SECONDS),
+            "last_claimed": now,
+            "resume_pending": True
+        }},
+        sort=CLAIM_ORDER,
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+    return doc["_id"] if doc else None
+
+def claim_pages(pages, limit=LEASE_BATCH_SIZE, worker_id=WORKER_ID, where=None):
+    # Each claim is a single atomic find_one_and_update, so concurrent
+    # workers can never hold the same page.
+    claimed = []
+
+    for _ in range(limit):
+        title = claim_page(pages, worker_id, where)
+        if title is None:
+            break
+        claimed.append(title)
+
+    return claimed
+
+def release_pages(pages, titles=None, worker_id=WORKER_ID, finished=False):
+    # Unfinished pages keep resume_pending so the next run starts with them
+    query = {"lease_owner": worker_id}
+
+    if titles is not None:
+        query["_id"] = {"$in": list(titles)}
+
+    unset = {"lease_owner": "", "lease_expires": ""}
+
+    if finished:
+        unset["resume_pending"] = ""
+
+    pages.update_many(query, {"$unset": unset})
+
+# ---------------- SINGLETON TASKS ---------------- #
+
+def acquire_lock(locks, name, seconds, worker_id=WORKER_ID):
+    # Lets one worker per interval run shared steps (discovery, topic
+    # modelling). The upsert collides on _id while another holder's lock is
+    # still valid.
+    now = datetime.utcnow()
+
+    try:
+        locks.find_one_and_update(
+            {"_id": name, "expires": {"$lt": now}},
+            {"$set": {
+                "owner": worker_id,
+                "acquired": now,
+                "expires": now + timedelta(seconds=seconds)
+            }},
+            upsert=True
+        )
+        return True
+
+    except DuplicateKeyError:
+        return False
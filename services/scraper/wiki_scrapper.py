@@ -1,17 +1,44 @@
 import requests
 from datetime import datetime, timedelta
-import os, re
-import logging, time
+import os, re, sys, signal
+import argparse, multiprocessing
+import logging, time, threading
 import mwparserfromhell as mwpf
-from pymongo import MongoClient
-from engine.core_engine import analyze_edit
+from engine import db
+from engine.core_engine import analyze_edit, encode_edit
 from services.scraper.http_client import safe_get
 from collections import Counter
 from engine.topic_modeling import generate_topics
+from engine.anomaly_detection import observe_analysis, observe_run
+from engine.anomaly_ml import run_ml_anomaly_detection
+from engine.feature_store import record_edit_features
+from engine.embedding_store import record_edit_embedding
+from engine.editor_profiles import record_edit as record_editor_edit
+from engine.revision_archive import ensure_indexes as ensure_revision_indexes
+from engine.rollups import record_analysis, record_run
+from engine.instrumentation import span, timed, stage_summary, reset as reset_stages
+from engine.profiling import start_profiling, finish_profiling, peak_rss_mb
+from services.scraper.leases import (
+    WORKER_ID, LEASE_BATCH_SIZE, ensure_lease_indexes,
+    claim_pages, release_pages, acquire_lock
+)
+from services.alerts.outbox import (
+    ALERT_DRAIN_SECONDS, enqueue_alert, start_dispatcher, stop_dispatcher,
+    reset_stats as reset_alert_stats
+)
+from services.scraper.wikis import (
+    WIKI_CONTENT_NAMESPACE, get_wiki, configured_wikis, load_cursor, save_cursor
+)
+from services.scraper.embedding_stage import EmbeddingStage
+from services.scraper.checkpoints import (
+    RUN_BUDGET_SECONDS, CHECKPOINT_SECONDS, COUNTERS, handle_stop_signals, stop_requested,
+    page_budget_left, ensure_checkpoint_indexes, start_checkpoint,
+    save_checkpoint, finish_checkpoint, recover_interrupted
+)
 
 # ---------------- CONFIG ---------------- #
 
-MAX_PAGES_PER_RUN = 1000
+MAX_PAGES_PER_RUN = int(os.getenv("INFOGUARD_MAX_PAGES", "1000"))
 
 # Only run BERTopic if at least this many new risky edits
 MIN_RISKY_DOCS_FOR_TOPIC = 5
@@ -19,6 +46,10 @@ MIN_RISKY_DOCS_FOR_TOPIC = 5
 # Only consider edits from last X hours
 TOPIC_LOOKBACK_HOURS = 6
 
+# Shared steps run by at most one worker per interval
+DISCOVERY_INTERVAL_SECONDS = 30 * 60
+POST_RUN_INTERVAL_SECONDS = 30 * 60
+
 
 # ---------------- LOGGING ---------------- #
 
@@ -32,37 +63,36 @@ logger = logging.getLogger(__name__)
 
 # ---------------- MONGO ---------------- #
 
-MONGO_URI = os.getenv("MONGODB_URI")
-
-if not MONGO_URI:
-    raise RuntimeError("MONGODB_URI not set")
-
-client = MongoClient(MONGO_URI)
-db = client['infoguard']
-
-pages = db["pages"]
-revisions = db["revisions"]
-analysis = db["analysis"]
-runs = db["runs"]
+# Resolved on first use through the shared client in engine.db
+pages = db.pages
+analysis = db.analysis
+locks = db.collection("locks")
+run_checkpoints = db.collection("run_checkpoints")
 
 
 # ---------------- DISCOVERY ---------------- #
 
-def fetch_recent_changes(limit=1000):
+def fetch_recent_changes(wiki, limit=1000, since=None):
 
-    url = "https://en.wikipedia.org/w/api.php"
+    url = wiki.api_url
 
     params = {
         "action": "query",
         "list": "recentchanges",
         "rclimit": limit,
-        "rcnamespace": 0,
+        "rcnamespace": WIKI_CONTENT_NAMESPACE,
         "rcprop": "title|timestamp|user|comment",
         "format": "json"
     }
 
+    # newest first, stopping at changes an earlier discovery already counted
+    if since:
+        params["rcend"] = since
+
     headers = {"User-Agent": "InfoguardAI/1.0"}
 
+    wiki.limiter.acquire()
+
     data = safe_get(url, params, headers)
 
     if not data:
@@ -84,36 +114,36 @@ def get_top_edited_pages(recent_changes, top_n=10):
     return [title for title, _ in counts.most_common(top_n)]
 
 
-def update_watchlist_with_top_pages(top_pages):
+def update_watchlist_with_top_pages(top_pages, wiki):
 
     for title in top_pages:
 
-        if pages.find_one({"_id": title}) is None:
+        if db.add_page(wiki.page_key(title), wiki=wiki.name):
+            logger.info("Added to watchlist: %s", wiki.page_key(title))
 
-            pages.insert_one({
-                "_id": title,
-                "last_revid": None,
-                "last_checked": None,
-                "watch_status": "active",
-                "priority_score": 0
-            })
 
-            logger.info("Added to watchlist: %s", title)
+def discover_active_pages(wiki, limit=900, top_n=500):
 
+    logger.info("Discovering active pages on %s", wiki.name)
 
-def discover_active_pages(limit=900, top_n=500):
+    since = load_cursor(wiki)
 
-    logger.info("Discovering active Wikipedia pages")
+    recent_changes = fetch_recent_changes(wiki, limit, since)
 
-    recent_changes = fetch_recent_changes(limit)
+    # rcend is inclusive
+    recent_changes = [c for c in recent_changes if c["timestamp"] != since]
 
     top_pages = get_top_edited_pages(recent_changes, top_n)
 
-    update_watchlist_with_top_pages(top_pages)
+    update_watchlist_with_top_pages(top_pages, wiki)
+
+    if recent_changes:
+        save_cursor(wiki, max(c["timestamp"] for c in recent_changes))
 
 
 # ---------------- TEXT CLEANING ---------------- #
 
+@timed("clean_wiki_text_nlp")
 def clean_wiki_text_nlp(text):
 
     wikicode = mwpf.parse(text)
@@ -129,9 +159,11 @@ def clean_wiki_text_nlp(text):
 
 # ---------------- REVISION FETCH ---------------- #
 
-def fetch_latest_revision(title):
+def fetch_latest_revision(title, wiki=None):
+
+    wiki = wiki or get_wiki()
 
-    url = "https://en.wikipedia.org/w/api.php"
+    url = wiki.api_url
 
     params = {
         "action": "query",
@@ -147,6 +179,8 @@ def fetch_latest_revision(title):
         "User-Agent": "InfoGuardAI/1.0"
     }
 
+    wiki.limiter.acquire()
+
     return safe_get(url, params, headers)
 
 
@@ -170,88 +204,125 @@ def extract_revision_info(data):
 
 # ---------------- CORE MONITOR ---------------- #
 
-def monitor_page(title):
+# observe() is a compare-and-swap across processes; within one, fetch
+# threads take turns so they do not keep retrying against each other
+_observe_lock = threading.Lock()
+
+def fetch_edit(title, wiki=None):
+    # API and read side of a page check: the edit to score, or None when
+    # the page is unchanged (or could not be fetched)
 
-    logger.info("Checking: %s", title)
+    wiki = wiki or get_wiki()
+    key = wiki.page_key(title)
 
-    data = fetch_latest_revision(title)
+    logger.info("Checking: %s", key)
+
+    data = fetch_latest_revision(title, wiki)
 
     if not data:
-        return {"changed": False, "flagged": False}
+        return None
 
     rev_info = extract_revision_info(data)
 
     if not rev_info:
-        return {"changed": False, "flagged": False}
+        return None
 
-    page = pages.find_one({"_id": title})
+    with span("mongo_read"):
+        page = db.get_page(key)
 
     if page is None:
 
-        pages.insert_one({
-            "_id": title,
-            "last_revid": rev_info["revid"],
-            "last_checked": datetime.utcnow(),
-            "watch_status": "active",
-            "priority_score": 0
-        })
+        with span("mongo_write"):
+            db.add_page(key, rev_info["revid"], datetime.utcnow(), wiki=wiki.name)
 
-        return {"changed": False, "flagged": False}
+        return None
 
     if page["last_revid"] == rev_info["revid"]:
 
-        pages.update_one(
-            {"_id": title},
-            {"$set": {"last_checked": datetime.utcnow()}}
-        )
+        with span("mongo_write"):
+            db.mark_checked(key)
 
-        return {"changed": False, "flagged": False}
+        return None
 
-    logger.warning("Change detected on %s", title)
+    logger.warning("Change detected on %s", key)
 
     new_clean = clean_wiki_text_nlp(rev_info["content"])
 
-    prev = revisions.find_one(
-        {"page": title},
-        sort=[("timestamp", -1)]
-    )
+    with span("mongo_read"):
+        prev = db.latest_revision(key)
+
+    return {
+        "wiki": wiki.name,
+        "page": key,
+        "rev_info": rev_info,
+        "previous_revid": page["last_revid"],
+        "old_clean": prev["clean_content"] if prev else "",
+        "new_clean": new_clean
+    }
 
-    old_clean = prev["clean_content"] if prev else ""
 
-    analysis_result = analyze_edit(
-        old_text=old_clean,
-        new_text=new_clean,
-        username=rev_info["user"]
-    )
+def store_edit(edit, analysis_result):
 
-    revisions.insert_one({
-        "page": title,
-        "revid": rev_info["revid"],
-        "user": rev_info["user"],
-        "timestamp": rev_info["timestamp"],
-        "clean_content": new_clean,
-        "previous_revid": page["last_revid"]
-    })
+    title = edit["page"]
+    rev_info = edit["rev_info"]
+    old_clean = edit["old_clean"]
+    new_clean = edit["new_clean"]
+
+    with span("mongo_write"):
+        db.insert_revision({
+            "page": title,
+            "wiki": edit["wiki"],
+            "revid": rev_info["revid"],
+            "user": rev_info["user"],
+            "timestamp": rev_info["timestamp"],
+            "clean_content": new_clean,
+            "previous_revid": edit["previous_revid"]
+        })
 
-    analysis.insert_one({
+    analysis_doc = {
         "page": title,
+        "wiki": edit["wiki"],
         "revid": rev_info["revid"],
         "username": rev_info["user"],
         "final_risk": analysis_result["final_risk"],
         "semantic_similarity": analysis_result["semantic_similarity"],
         "username_risk": analysis_result["username_risk"],
+        "editor_risk": analysis_result["editor"]["risk_score"],
         "content_risk": analysis_result["content_risk"],
         "flagged": analysis_result["flagged"],
         "created_at": datetime.utcnow()
-    })
+    }
 
-    pages.update_one(
-        {"_id": title},
-        {"$set": {
-            "last_revid": rev_info["revid"],
-            "last_checked": datetime.utcnow()
-        }}
-    )
+    with span("mongo_write"):
+        db.insert_analysis(analysis_doc)
+
+    if analysis_doc["flagged"]:
+        with span("alert_outbox"):
+            enqueue_alert(analysis_doc)
+
+    with span("feature_store"):
+        record_edit_features(title, old_clean, new_clean, rev_info, analysis_result)
+
+    with span("editor_profiles"):
+        record_editor_edit(rev_info["user"], title, analysis_result["flagged"])
+
+    with span("embedding_store"):
+        record_edit_embedding(title, rev_info, analysis_result)
+
+    with span("rollups"):
+        record_analysis(analysis_doc)
+
+    with span("anomaly_stream"), _observe_lock:
+        spikes = observe_analysis(analysis_doc)
+
+    for spike in spikes:
+        logger.warning(
+            "Risk spike on %s (%s, z=%s)",
+            spike["scope"], spike["metric"], spike["z"]
+        )
+
+    with span("mongo_write"):
+        db.mark_checked(title, rev_info["revid"])
 
     return {
         "changed": True,
@@ -259,6 +330,23 @@ def monitor_page(title):
     }
 
 
+def monitor_page(title, wiki=None, encode=encode_edit):
+
+    edit = fetch_edit(title, wiki)
+
+    if edit is None:
+        return {"changed": False, "flagged": False}
+
+    analysis_result = analyze_edit(
+        old_text=edit["old_clean"],
+        new_text=edit["new_clean"],
+        username=edit["rev_info"]["user"],
+        encode=encode
+    )
+
+    return store_edit(edit, analysis_result)
+
+
 # ---------------- TOPIC MODEL CONDITION ---------------- #
 
 def should_run_topic_model():
@@ -278,64 +366,351 @@ def should_run_topic_model():
     return risky_docs >= MIN_RISKY_DOCS_FOR_TOPIC
 
 
+# ---------------- FETCH WORKERS ---------------- #
+
+class RunState:
+    # Counters and stop status shared by every fetch worker of a run
+
+    def __init__(self, deadline, wikis):
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.status = "completed"
+        self.error = None
+        self.last_page = None
+        self.counters = {c: 0 for c in COUNTERS}
+        self.by_wiki = {w.name: {c: 0 for c in COUNTERS} for w in wikis}
+
+    def stop(self, status):
+        with self.lock:
+            if self.status == "completed":
+                self.status = status
+
+    def fail(self, error):
+        with self.lock:
+            self.error = self.error or error
+        self.stop("failed")
+
+    def should_stop(self):
+        if stop_requested():
+            self.stop("stopped")
+        elif page_budget_left(self.deadline, time.time()) <= 0:
+            self.stop("budget_exhausted")
+        return self.status != "completed"
+
+    def pages_left(self):
+        with self.lock:
+            return MAX_PAGES_PER_RUN - self.counters["pages_checked"]
+
+    def start_page(self, wiki):
+        # Takes one page off the run's allowance (MAX_PAGES_PER_RUN spans
+        # all wikis); False once it is spent or the run is winding down
+        if self.should_stop():
+            return False
+
+        with self.lock:
+            if self.counters["pages_checked"] >= MAX_PAGES_PER_RUN:
+                return False
+            self.counters["pages_checked"] += 1
+            self.by_wiki[wiki]["pages_checked"] += 1
+
+        return True
+
+    def record(self, wiki, key, result):
+        with self.lock:
+            self.last_page = key
+            for counter, hit in (("changes_detected", result["changed"]), ("flagged", result["flagged"])):
+                if hit:
+                    self.counters[counter] += 1
+                    self.by_wiki[wiki][counter] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def wiki_summary(self, seconds):
+        with self.lock:
+            return {
+                name: {
+                    **c,
+                    "pages_per_minute": round(c["pages_checked"] / (seconds / 60), 2) if seconds > 0 else 0
+                }
+                for name, c in self.by_wiki.items()
+            }
+
+
+def wiki_worker(wiki, run, embedder):
+    # One thread of a wiki's fetch pool: claims that wiki's pages in
+    # batches and checks them, scoring through the shared embedding stage
+
+    try:
+
+        while not run.should_stop():
+
+            limit = min(LEASE_BATCH_SIZE, run.pages_left())
+
+            if limit <= 0:
+                break
+
+            with span("mongo_lease"):
+                batch = claim_pages(pages, limit, where=wiki.page_filter)
+
+            if not batch:
+                break
+
+            done = []
+
+            try:
+
+                for key in batch:
+
+                    if not run.start_page(wiki.name):
+                        break
+
+                    result = monitor_page(wiki.title_of(key), wiki, embedder.encode)
+
+                    done.append(key)
+
+                    run.record(wiki.name, key, result)
+
+            finally:
+                with span("mongo_lease"):
+                    release_pages(pages, done, finished=True)
+                    # the rest stays resume_pending for the next run
+                    release_pages(pages, [k for k in batch if k not in done])
+
+    except Exception as e:
+        logger.exception("Fetch worker %s failed", threading.current_thread().name)
+        run.fail(e)
+
+
 # ---------------- MAIN ---------------- #
 
-start_time = time.time()
+def main():
+
+    start_time = time.time()
+    deadline = start_time + RUN_BUDGET_SECONDS
 
-pages_checked = 0
-changes_detected = 0
-flagged_count = 0
+    if threading.current_thread() is threading.main_thread():
+        handle_stop_signals()
 
+    reset_stages()
 
-discover_active_pages()
+    profiler = start_profiling()
 
+    reset_alert_stats()
+    start_dispatcher()
 
-pages_cursor = pages.find(
-    {"watch_status": "active"}
-).sort([
-    ("priority_score", -1),
-    ("last_checked", 1)
-]).limit(MAX_PAGES_PER_RUN)
+    ensure_lease_indexes(pages)
+    ensure_checkpoint_indexes(run_checkpoints)
+    ensure_revision_indexes()
 
+    for run_doc in recover_interrupted(run_checkpoints, db.runs):
+        record_run(run_doc)
+        logger.warning(
+            "Recovered interrupted run %s (%s pages checked before it stopped)",
+            run_doc["_id"], run_doc["pages_checked"]
+        )
+
+    run_id = start_checkpoint(run_checkpoints, WORKER_ID)
+
+    wikis = configured_wikis()
+
+    for wiki in wikis:
+        if acquire_lock(locks, f"discovery:{wiki.name}", DISCOVERY_INTERVAL_SECONDS):
+            discover_active_pages(wiki)
+        else:
+            logger.info("Discovery on %s recently done by another worker — skipping", wiki.name)
+
+    logger.info(
+        "Worker %s claiming pages on %s (budget %ss)",
+        WORKER_ID, ", ".join(f"{w.name} ({w.workers} threads)" for w in wikis), RUN_BUDGET_SECONDS
+    )
+
+    run = RunState(deadline, wikis)
+    embedder = EmbeddingStage().start()
+
+    threads = [
+        threading.Thread(
+            target=wiki_worker, args=(wiki, run, embedder),
+            name=f"{wiki.name}-{i}", daemon=True
+        )
+        for wiki in wikis
+        for i in range(wiki.workers)
+    ]
+
+    fetch_started = time.time()
+
+    try:
 
-pages_to_monitor = [p["_id"] for p in pages_cursor]
+        for t in threads:
+            t.start()
 
-logger.info("Monitoring %s pages", len(pages_to_monitor))
+        # the pools run on their own threads; this one keeps the checkpoint fresh
+        last_checkpoint = time.time()
 
+        for t in threads:
+            while t.is_alive():
+                t.join(max(0.1, CHECKPOINT_SECONDS - (time.time() - last_checkpoint)))
 
-for title in pages_to_monitor:
+                if time.time() - last_checkpoint >= CHECKPOINT_SECONDS:
+                    with span("checkpoint"):
+                        save_checkpoint(
+                            run_checkpoints, run_id, run.snapshot(), run.last_page, stage_summary()
+                        )
+                    last_checkpoint = time.time()
 
-    pages_checked += 1
+    finally:
+        embedder.stop()
+        # anything claimed but not checked stays resume_pending
+        release_pages(pages)
 
-    result = monitor_page(title)
+    if run.error is not None:
+        raise run.error
 
-    if result["changed"]:
-        changes_detected += 1
+    fetch_seconds = time.time() - fetch_started
 
-    if result["flagged"]:
-        flagged_count += 1
+    status = run.status
+    counters = run.snapshot()
+
+    if status != "completed":
+        logger.warning(
+            "Stopping early (%s) after %s pages — remaining claimed pages resume next run",
+            stop_requested() or status, counters["pages_checked"]
+        )
 
-logger.info("Running BERTopic model")
+    logger.info("Worker %s checked %s pages", WORKER_ID, counters["pages_checked"])
 
-generate_topics()
+    save_checkpoint(run_checkpoints, run_id, counters, stages=stage_summary())
 
+    if status != "stopped" and time.time() < deadline \
+            and acquire_lock(locks, "post_run", POST_RUN_INTERVAL_SECONDS):
 
-duration = round(time.time() - start_time, 2)
+        logger.info("Running BERTopic model")
 
+        generate_topics()
 
-runs.insert_one({
+        # post-run steps can outlast INTERRUPTED_AFTER_SECONDS; keep the
+        # run from being recovered as interrupted meanwhile
+        save_checkpoint(run_checkpoints, run_id, counters, stages=stage_summary())
 
-    "timestamp": datetime.utcnow(),
+        logger.info("Scoring new edits with IsolationForest")
 
-    "pages_checked": pages_checked,
+        with span("ml_anomaly_detection"):
+            ml_flagged = run_ml_anomaly_detection()
+
+        logger.info("ML anomalies stored: %s", ml_flagged)
+
+        save_checkpoint(run_checkpoints, run_id, counters, stages=stage_summary())
+
+    with span("alert_drain"):
+        alerts = stop_dispatcher(
+            0 if status == "stopped" else max(0, min(ALERT_DRAIN_SECONDS, deadline - time.time()))
+        )
 
-    "changes_detected": changes_detected,
+    logger.info("Alerts: %s", alerts)
 
-    "flagged": flagged_count,
+    profile = finish_profiling(profiler)
 
-    "duration_seconds": duration
+    duration = round(time.time() - start_time, 2)
 
-})
+    run_doc = {
+
+        "_id": run_id,
+
+        "timestamp": datetime.utcnow(),
+
+        "worker_id": WORKER_ID,
+
+        "status": status,
+
+        **counters,
+
+        "duration_seconds": duration,
+
+        "pages_per_minute": round(counters["pages_checked"] / (duration / 60), 2) if duration > 0 else 0,
+
+        "wikis": run.wiki_summary(fetch_seconds),
+
+        "embedding_batches": embedder.summary(),
+
+        "stages": stage_summary(),
+
+        "alerts": alerts,
+
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+
+    }
+
+    if profile:
+        run_doc["profile"] = profile
+        logger.info(
+            "Profile written to %s (peak RSS %s MB)",
+            profile["profile_path"], profile["peak_rss_mb"]
+        )
+
+    recovered = db.save_run(run_doc)
+
+    finish_checkpoint(run_checkpoints, run_id)
+
+    # a run already recovered as interrupted was counted in the rollups then
+    if recovered:
+        logger.warning("Run %s was recovered as interrupted before it finished", run_id)
+    else:
+        record_run(run_doc)
+
+    # partial runs would register as drops in the per-run metrics
+    if status == "completed":
+        for spike in observe_run(run_doc):
+            logger.warning("Run metric spike: %s (z=%s)", spike["metric"], spike["z"])
+
+    for stage, stats in sorted(
+        run_doc["stages"].items(), key=lambda kv: -kv[1]["total_seconds"]
+    ):
+        logger.info(
+            "Stage %-22s n=%-5s total=%.2fs p50=%.1fms p95=%.1fms p99=%.1fms",
+            stage, stats["count"], stats["total_seconds"],
+            stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]
+        )
+
+    logger.info("Run complete in %ss", duration)
+
+
+def run_workers(count):
+    # Spawned (not forked) so each worker builds its own Mongo client
+    ctx = multiprocessing.get_context("spawn")
+
+    workers = [ctx.Process(target=main, name=f"worker-{i}") for i in range(count)]
+
+    # pass a stop on to the workers (SIGTERM), so they release their leases
+    # and record the run as stopped instead of outliving this process
+    def forward(signum, frame):
+        logger.warning("%s: stopping %s workers", signal.Signals(signum).name, count)
+        for w in workers:
+            if w.is_alive():
+                w.terminate()
+
+    for w in workers:
+        w.start()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, forward)
+
+    for w in workers:
+        w.join()
+
+    return max((w.exitcode or 0) for w in workers)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="InfoGuard AI monitoring cycle")
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("INFOGUARD_WORKERS", "1")),
+        help="worker processes sharing the watchlist through page leases"
+    )
+    args = parser.parse_args()
 
+    if args.workers > 1:
+        sys.exit(run_workers(args.workers))
 
-logger.info("Run complete in %ss", duration)
\ No newline at end of file
+    main()
@@ -0,0 +1,120 @@
+import os, time, threading
+from datetime import datetime
+from engine.db import collection
+
+wiki_cursors = collection("wiki_cursors")
+
+# ---------------- CONFIG ---------------- #
+
+# Wikis monitored by each run, e.g. "enwiki,dewiki,frwiki"
+WIKI_NAMES = [w.strip() for w in os.getenv("INFOGUARD_WIKIS", "enwiki").split(",") if w.strip()]
+
+# Pages of this wiki keep their bare title as watchlist key, as they did
+# before more than one wiki could be monitored
+DEFAULT_WIKI = "enwiki"
+
+# Defaults for every wiki; each can be overridden per wiki with
+# INFOGUARD_WIKI_<NAME>_API_URL / _WORKERS / _RPS
+WIKI_WORKERS = int(os.getenv("INFOGUARD_WIKI_WORKERS", "4"))
+WIKI_REQUESTS_PER_SECOND = float(os.getenv("INFOGUARD_WIKI_RPS", "10"))
+
+# MediaWiki namespace watched for discovery (0 = articles)
+WIKI_CONTENT_NAMESPACE = 0
+
+def wiki_setting(name, key, default):
+    return os.getenv(f"INFOGUARD_WIKI_{name.upper()}_{key}", default)
+
+def default_api_url(name):
+    if name == DEFAULT_WIKI:
+        # still honours the single-wiki override (local stand-ins, benchmarks)
+        return os.getenv("WIKI_API_URL", "https://en.wikipedia.org/w/api.php")
+
+    if not name.endswith("wiki"):
+        raise ValueError(f"Set INFOGUARD_WIKI_{name.upper()}_API_URL for {name}")
+
+    return f"https://{name[:-len('wiki')].replace('_', '-')}.wikipedia.org/w/api.php"
+
+# ---------------- RATE LIMIT ---------------- #
+
+class RateLimiter:
+    # Blocking token bucket shared by all fetch workers of one wiki, so
+    # adding workers adds concurrency, not load on the wiki's API
+
+    def __init__(self, per_second, burst=None):
+        self.rate = per_second
+        self.capacity = burst or max(1, int(per_second))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+# ---------------- WIKIS ---------------- #
+
+class Wiki:
+
+    def __init__(self, name):
+        self.name = name
+        self.api_url = wiki_setting(name, "API_URL", None) or default_api_url(name)
+        self.workers = int(wiki_setting(name, "WORKERS", WIKI_WORKERS))
+        self.limiter = RateLimiter(float(wiki_setting(name, "RPS", WIKI_REQUESTS_PER_SECOND)))
+
+        # Watchlist namespace: revids and titles repeat across wikis, so
+        # every page key (pages._id, and `page` everywhere downstream)
+        # carries the wiki prefix
+        self.namespace = "" if name == DEFAULT_WIKI else f"{name}:"
+
+    def page_key(self, title):
+        return self.namespace + title
+
+    def title_of(self, key):
+        return key[len(self.namespace):]
+
+    @property
+    def page_filter(self):
+        # pages added before the `wiki` field existed belong to DEFAULT_WIKI
+        if self.name == DEFAULT_WIKI:
+            return {"wiki": {"$in": [None, self.name]}}
+        return {"wiki": self.name}
+
+    def __repr__(self):
+        return f"Wiki({self.name!r})"
+
+_wikis = {}
+
+def get_wiki(name=DEFAULT_WIKI):
+    if name not in _wikis:
+        _wikis[name] = Wiki(name)
+    return _wikis[name]
+
+def configured_wikis():
+    return [get_wiki(name) for name in WIKI_NAMES]
+
+# ---------------- DISCOVERY CURSORS ---------------- #
+
+# Newest recentchanges timestamp already counted for each wiki; discovery
+# only reads changes after it
+
+def load_cursor(wiki):
+    doc = wiki_cursors.find_one({"_id": wiki.name})
+    return doc["rc_timestamp"] if doc else None
+
+def save_cursor(wiki, rc_timestamp):
+    wiki_cursors.update_one(
+        {"_id": wiki.name},
+        {"$max": {"rc_timestamp": rc_timestamp}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )